@@ -0,0 +1,4 @@
+# Benchmarks of the dashboard callbacks, run from the repository root:
+#   python -m benchmarks --scale 10 --output results.json
+#   python -m benchmarks.bench_production_map
+#   python -m benchmarks.bench_figures
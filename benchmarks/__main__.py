@@ -0,0 +1,54 @@
+# Benchmark and load-test report of the dashboard as JSON
+# python -m benchmarks [--scale N] [--repeat N] [--requests N] [--concurrency N]
+#                      [--url URL --pids PID ...] [--output FILE]
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks import callbacks, load
+from benchmarks.common import load_app, rss_bytes
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--scale', type=int, default=1, help='multiply the honey rows (synthetic data)')
+    parser.add_argument('--repeat', type=int, default=5, help='calls per callback and state value')
+    parser.add_argument('--requests', type=int, default=500, help='requests of the load test, 0 to skip it')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients of the load test')
+    parser.add_argument('--url', help='load test a running server instead of an in-process one')
+    parser.add_argument('--pids', type=int, nargs='*', help='worker processes whose RSS is reported')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    commit = current_commit()
+    start = time.perf_counter()
+    app = load_app(args.scale)
+    report = {
+        'commit': commit,
+        'scale': args.scale,
+        'rows': len(app.data_store.current().honey_data),
+        'startup_s': time.perf_counter() - start,
+        'callbacks': callbacks.run(app, args.repeat),
+    }
+    if args.requests:
+        report['load'] = load.run(app, args.requests, args.concurrency, args.url, args.pids)
+    report['rss_bytes'] = rss_bytes()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# Cube load of the pandas and SQLite data paths of the snapshot store as the row count grows
+# Run from the repository root: python -m benchmarks.bench_data_access [repeat] [scales...]
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.common import SRC_DIR, summarize, scaled_honey_data
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from aggregates import HoneyCube  # noqa: E402
+from data_access import SQLiteBackend, build_database  # noqa: E402
+from schema import HONEY_SCHEMA  # noqa: E402
+
+SCALES = [1, 100, 1000]
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def run(scale, repeat, work_dir):
+    csv_path = os.path.join(work_dir, 'honey_x{}.csv'.format(scale))
+    scaled_honey_data(scale).to_csv(csv_path, index=False)
+
+    start = time.perf_counter()
+    honey_data = HONEY_SCHEMA.apply(pd.read_csv(csv_path))
+    pandas_load = time.perf_counter() - start
+    start = time.perf_counter()
+    database = build_database(csv_path)
+    sqlite_build = time.perf_counter() - start
+
+    backend = SQLiteBackend(database)
+    print('x{}: {} rows, DataFrame {:.1f} MB loaded in {:.2f}s, SQLite file {:.1f} MB built in {:.2f}s'.format(
+        scale, len(honey_data), honey_data.memory_usage(deep=True).sum() / 1e6, pandas_load,
+        os.path.getsize(database) / 1e6, sqlite_build))
+    # What the snapshot store does on a load: the cube of every row, or of the sums read from SQLite
+    loads = [
+        ('cube from the rows', lambda: HoneyCube(honey_data)),
+        ('cube_rows', backend.cube_rows),
+        ('cube from cube_rows', lambda: HoneyCube(backend.cube_rows())),
+    ]
+    for name, func in loads:
+        print('  {:<28} {:9.3f} ms'.format(name, _time(func, repeat)['p50_ms']))
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    scales = [int(scale) for scale in sys.argv[2:]] or SCALES
+    with tempfile.TemporaryDirectory(prefix='honey_bench_') as work_dir:
+        for scale in scales:
+            run(scale, repeat, work_dir)
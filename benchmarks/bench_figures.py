@@ -0,0 +1,59 @@
+# Figure construction time per chart type
+# Compares the raw dict builders of figures.py with building the same figures
+# through validated plotly.graph_objects, with and without JSON serialization
+# (serialization.figure_json for the raw dicts, Figure.to_json for the validated ones).
+# Run from the repository root: python -m benchmarks.bench_figures
+import statistics
+import sys
+import time
+
+import plotly.graph_objects as go
+
+from benchmarks.common import load_app
+
+app = load_app()
+import figures  # noqa: E402
+from serialization import figure_json  # noqa: E402
+
+
+# Arguments of every chart type, taken from the current data snapshot
+def chart_builders():
+    snapshot = app.data_store.current()
+    cube = snapshot.cube
+    years, values = cube.series('All', 'production')
+    production = cube.totals_by_state('production')
+    top_index = production.argsort()[-5:]
+    codes, map_production, names = snapshot.map_table.select('All')
+    temperature = snapshot.temperature_data
+    return {
+        'line': lambda: figures.line_figure(years, values, 'US Honey Production by Year', 'Total Production',
+                                            'Year'),
+        'bar': lambda: figures.bar_figure(cube.states[top_index], production[top_index]),
+        'choropleth': lambda: figures.map_figure(codes, map_production, names),
+        'scatter': lambda: figures.bubble_figure(cube.states, production, cube.totals_by_state('colonies_number')),
+        'temperature': lambda: figures.temperature_figure(temperature['Year'].to_numpy(),
+                                                          temperature['Value'].to_numpy()),
+    }
+
+
+# Median milliseconds per call
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print('{:<12} {:>12} {:>12} {:>14} {:>14}'.format('chart', 'raw dict', 'validated', 'raw + json',
+                                                      'valid. + json'))
+    for name, build in chart_builders().items():
+        print('{:<12} {:>9.3f} ms {:>9.3f} ms {:>11.3f} ms {:>11.3f} ms'.format(
+            name,
+            median_ms(build, repeat),
+            median_ms(lambda: go.Figure(build()), repeat),
+            median_ms(lambda: figure_json(build()), repeat),
+            median_ms(lambda: go.Figure(build()).to_json(), repeat)))
@@ -0,0 +1,63 @@
+# Per-call latency of production_map before and after the startup state index
+# Run from the repository root: python -m benchmarks.bench_production_map
+import sys
+import time
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from benchmarks.common import load_app, summarize
+
+app = load_app()
+
+
+# The map callback as it was: file read, groupby and merge on every call
+def legacy_production_map(state_input):
+    states_lat_long = pd.read_csv(app.STATES_FILE)
+    us_map = app.data_store.current().honey_data.groupby('state')[['production']].sum().reset_index()
+    us_map = us_map.merge(states_lat_long, left_on='state', right_on='state_name')
+    us_map.drop('state_name', axis=1, inplace=True)
+    us_map.rename(columns={'state_x': 'state', 'state_y': 'code'}, inplace=True)
+    if state_input != 'All':
+        us_map = us_map.loc[us_map['state'] == state_input]
+    us_map_fig = go.Figure(data=go.Choropleth(
+        locations=us_map['code'],
+        z=us_map['production'],
+        locationmode='USA-states',
+        colorscale='Oranges',
+        text=us_map['state'],
+        showscale=None if state_input == 'All' else False
+    ))
+    us_map_fig.update_layout(
+        title=dict(
+            text='Total Honey Production States by States',
+            font=dict(size=20, color='#0C0B09')
+        ),
+        geo_scope='usa',
+        margin={"r": 0, "t": 30, "l": 0, "b": 0}
+    )
+    return us_map_fig
+
+
+# Milliseconds per call over repeated calls cycling through every state
+def time_calls(func, states, repeat):
+    timings = []
+    for _ in range(repeat):
+        for state in states:
+            start = time.perf_counter()
+            func(state)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    summary = summarize(timings)
+    print('{:<28} mean {:8.3f} ms   p50 {:8.3f} ms   p95 {:8.3f} ms'.format(
+        name, summary['mean_ms'], summary['p50_ms'], summary['p95_ms']))
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    report('before (read_csv + merge)', time_calls(legacy_production_map, app.data_store.current().states, repeat))
+    report('after (state index)', time_calls(app.production_map.uncached, app.data_store.current().states, repeat))
+    report('after (figure cache)', time_calls(app.production_map, app.data_store.current().states, repeat))
@@ -0,0 +1,31 @@
+# Microbenchmarks of the callback functions for every state value
+import time
+
+from benchmarks.common import summarize
+
+# Functions of the app behind the states dropdown
+CALLBACKS = ['overview', 'trends', 'production_overtime_graph', 'colonies_number_graph', 'production_map',
+             'top_production_graph', 'production_colonies_graph', 'temperature_anomalies_graph']
+
+
+def _time_calls(func, values, repeat):
+    timings = []
+    for _ in range(repeat):
+        for value in values:
+            start = time.perf_counter()
+            func(value)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+# Timings of every callback without its cache, then of the whole dispatch with a warm cache
+def run(app, repeat=5):
+    states = app.data_store.current().states
+    results = {}
+    for name in CALLBACKS:
+        func = getattr(app, name)
+        results[name] = summarize(_time_calls(getattr(func, 'uncached', func), states, repeat))
+    app.figure_cache.clear()
+    results['dashboard (cold cache)'] = summarize(_time_calls(app.dashboard, states, 1))
+    results['dashboard (warm cache)'] = summarize(_time_calls(app.dashboard, states, repeat))
+    return results
@@ -0,0 +1,75 @@
+# Shared helpers of the benchmarks
+# The app is imported from src with its data files, optionally replaced by a
+# synthetically scaled copy of the honey dataset to expose scaling cliffs.
+import importlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+HONEY_CSV = 'US_honey_dataset_updated.csv'
+
+
+# Honey rows repeated scale times, as if every state/year was split into sub-regions
+# (the per-state/year totals grow with the scale, the shape of the cube does not)
+def scaled_honey_data(scale, seed=0):
+    honey_data = pd.read_csv(os.path.join(SRC_DIR, 'data', HONEY_CSV))
+    if scale <= 1:
+        return honey_data
+    rng = np.random.default_rng(seed)
+    scaled = pd.concat([honey_data] * scale, ignore_index=True)
+    # Jitter the metrics so the copies are not identical rows
+    for column in ['colonies_number', 'production', 'stocks', 'value_of_production']:
+        scaled[column] = (scaled[column] * rng.uniform(0.5, 1.5, len(scaled))).round().astype(np.int64)
+    scaled[scaled.columns[0]] = np.arange(len(scaled))
+    return scaled
+
+
+# Import the app from src, on a scaled copy of the data when scale > 1
+# The background data reload is disabled so it does not disturb the timings
+def load_app(scale=1):
+    os.environ.setdefault('HONEY_RELOAD_INTERVAL', '0')
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    if scale > 1:
+        work_dir = tempfile.mkdtemp(prefix='honey_bench_')
+        shutil.copytree(os.path.join(SRC_DIR, 'data'), os.path.join(work_dir, 'data'),
+                        ignore=shutil.ignore_patterns('*.store', HONEY_CSV))
+        scaled_honey_data(scale).to_csv(os.path.join(work_dir, 'data', HONEY_CSV), index=False)
+        os.chdir(work_dir)
+    else:
+        # The app reads its data files relative to src
+        os.chdir(SRC_DIR)
+    app = importlib.import_module('app')
+    app.create_app({'data_loading': 'eager'})
+    return app
+
+
+# Summary of a list of timings in milliseconds
+def summarize(timings):
+    timings = sorted(timings)
+    if not timings:
+        return {'count': 0}
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(round(p / 100 * (len(timings) - 1))))]
+
+    return {'count': len(timings), 'mean_ms': statistics.mean(timings), 'p50_ms': percentile(50),
+            'p95_ms': percentile(95), 'p99_ms': percentile(99), 'max_ms': timings[-1]}
+
+
+# Resident set size of a process in bytes (Linux), None when it cannot be read
+def rss_bytes(pid=None):
+    try:
+        with open('/proc/{}/status'.format(pid or os.getpid())) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,83 @@
+# Load test of the Flask server through /_dash-update-component
+# The requests are the ones the browser sends when the states dropdown changes.
+# Without a url, the app is served in-process by a threaded werkzeug server.
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+from benchmarks.common import rss_bytes, summarize
+
+
+# Request bodies of the callbacks triggered by the states dropdown, one per state value
+def request_bodies(base_url, states):
+    with urllib.request.urlopen(base_url + '/_dash-dependencies') as response:
+        dependencies = json.load(response)
+    bodies = []
+    for dependency in dependencies:
+        if dependency.get('clientside_function'):
+            continue
+        if dependency['output'].startswith('..'):
+            outputs = [dict(zip(['id', 'property'], output.split('.')))
+                       for output in dependency['output'][2:-2].split('...')]
+        else:
+            outputs = dict(zip(['id', 'property'], dependency['output'].split('.')))
+        for state in states:
+            bodies.append({
+                'output': dependency['output'],
+                'outputs': outputs,
+                'inputs': [{'id': i['id'], 'property': i['property'],
+                            'value': [state] if i['id'] == 'input-state' else None}
+                           for i in dependency['inputs']],
+                'changedPropIds': ['input-state.value'],
+                'state': [{'id': s['id'], 'property': s['property']} for s in dependency.get('state', [])],
+            })
+    return bodies
+
+
+def _post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        size = len(response.read())
+    return (time.perf_counter() - start) * 1000, size
+
+
+# Throughput and latency of requests sent by concurrent clients
+# pids are the worker processes whose RSS is reported (the current one when serving in-process)
+def run(app, requests=500, concurrency=8, url=None, pids=None, seed=0):
+    server = None
+    if url is None:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app.server, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}'.format(server.server_port)
+        pids = pids or [None]
+    try:
+        bodies = request_bodies(url, app.data_store.current().states)
+        rng = random.Random(seed)
+        picked = [rng.choice(bodies) for _ in range(requests)]
+        endpoint = url + '/_dash-update-component'
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda body: _post(endpoint, body), picked))
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = summarize([latency for latency, _ in results])
+    report.update({
+        'requests': requests,
+        'concurrency': concurrency,
+        'throughput_rps': requests / elapsed,
+        'mean_response_bytes': sum(size for _, size in results) / len(results),
+        'rss_bytes': {str(pid or 'self'): rss_bytes(pid) for pid in (pids or [])},
+    })
+    return report
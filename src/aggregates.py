@@ -0,0 +1,204 @@
+# Precomputed aggregates of the honey data
+# The raw rows are folded once into a dense state x year x metric cube so the
+# callbacks only have to slice arrays instead of running groupby on every request
+import hashlib
+import numpy as np
+
+from regions import region_members
+
+# Metrics stored in the cube (last axis)
+METRICS = ['production', 'colonies_number', 'stocks', 'value_of_production',
+           'yield_per_colony', 'average_price']
+
+
+class HoneyCube:
+    def __init__(self, honey_data, state_col='state', year_col='year', metrics=METRICS):
+        # Axis labels (states are sorted, matching the order of a groupby('state'))
+        state = honey_data[state_col]
+        if hasattr(state, 'cat'):
+            # Categorical states only need their integer codes ranked
+            codes, state_idx = np.unique(state.cat.codes.to_numpy(), return_inverse=True)
+            self.states = state.cat.categories.to_numpy()[codes]
+        else:
+            self.states, state_idx = np.unique(state.to_numpy(), return_inverse=True)
+        self.years, year_idx = np.unique(honey_data[year_col].to_numpy(), return_inverse=True)
+        self.metrics = list(metrics)
+
+        # Sum every row into its (state, year) cell
+        self.values = np.zeros((len(self.states), len(self.years), len(self.metrics)))
+        np.add.at(self.values, (state_idx, year_idx),
+                  honey_data[self.metrics].to_numpy(dtype=np.float64))
+        # Cells that have at least one row behind them
+        counts = np.zeros((len(self.states), len(self.years)), dtype=np.int64)
+        np.add.at(counts, (state_idx, year_idx), 1)
+        self.present = counts > 0
+
+        # National totals per year and totals per state over all the years
+        self.national = self.values.sum(axis=0)
+        self.national_present = self.present.any(axis=0)
+        self.state_totals = self.values.sum(axis=1)
+        self._index()
+
+    # Lookups from labels to positions on each axis, prefix sums and fingerprint of the content
+    def _index(self):
+        # Cumulative sums over the years (with a leading zero), so the total of any
+        # year range is the difference of two cells
+        self.cumulative = np.zeros((len(self.states), len(self.years) + 1, len(self.metrics)))
+        np.cumsum(self.values, axis=1, out=self.cumulative[:, 1:])
+        self.cumulative_present = np.zeros((len(self.states), len(self.years) + 1), dtype=np.int64)
+        np.cumsum(self.present, axis=1, out=self.cumulative_present[:, 1:])
+
+        self.state_pos = {state: i for i, state in enumerate(self.states)}
+        self.metric_pos = {metric: i for i, metric in enumerate(self.metrics)}
+
+        digest = hashlib.sha1(self.values.tobytes())
+        digest.update(self.present.tobytes())
+        digest.update('|'.join(map(str, self.states)).encode())
+        digest.update(self.years.astype(np.int64).tobytes())
+        self.version = digest.hexdigest()[:12]
+
+    # New cube with appended rows folded in, without re-reading the existing rows
+    # Only the cells touched by the new rows are added to the totals
+    def extended(self, new_rows, state_col='state', year_col='year'):
+        delta = HoneyCube(new_rows, state_col, year_col, self.metrics)
+        states = np.union1d(self.states, delta.states)
+        years = np.union1d(self.years, delta.years)
+        old_s, old_y = np.searchsorted(states, self.states), np.searchsorted(years, self.years)
+        new_s, new_y = np.searchsorted(states, delta.states), np.searchsorted(years, delta.years)
+
+        cube = object.__new__(HoneyCube)
+        cube.states, cube.years, cube.metrics = states, years, self.metrics
+        # Existing aggregates moved to their place on the (possibly) larger axes
+        cube.values = np.zeros((len(states), len(years), len(self.metrics)))
+        cube.values[np.ix_(old_s, old_y)] = self.values
+        cube.present = np.zeros((len(states), len(years)), dtype=bool)
+        cube.present[np.ix_(old_s, old_y)] = self.present
+        cube.national = np.zeros((len(years), len(self.metrics)))
+        cube.national[old_y] = self.national
+        cube.state_totals = np.zeros((len(states), len(self.metrics)))
+        cube.state_totals[old_s] = self.state_totals
+
+        # Add the contribution of the new rows
+        cube.values[np.ix_(new_s, new_y)] += delta.values
+        cube.present[np.ix_(new_s, new_y)] |= delta.present
+        cube.national[new_y] += delta.national
+        cube.national_present = cube.present.any(axis=0)
+        cube.state_totals[new_s] += delta.state_totals
+        cube._index()
+        return cube
+
+    # Canonical form of a dropdown selection: 'All', a single state name or a sorted
+    # tuple of state names (regions are expanded, unknown names are dropped).
+    # 'All' only stands for itself: picked along with states, it is dropped.
+    def resolve(self, selection):
+        if isinstance(selection, str):
+            selection = [selection]
+        names = set()
+        for value in selection or []:
+            if value == 'All':
+                continue
+            members = region_members(value)
+            names.update([value] if members is None else members)
+        names = tuple(sorted(name for name in names if name in self.state_pos))
+        if not names:
+            return 'All'
+        if len(names) == 1:
+            return names[0]
+        return names
+
+    # Canonical year range: None for all the years, otherwise (first, last) clipped to the data
+    def resolve_years(self, years):
+        if not years:
+            return None
+        first = min(max(int(min(years)), int(self.years[0])), int(self.years[-1]))
+        last = max(min(int(max(years)), int(self.years[-1])), first)
+        if first == self.years[0] and last == self.years[-1]:
+            return None
+        return first, last
+
+    # Positions on the year axis of a resolved year range
+    def year_slice(self, years):
+        if years is None:
+            return slice(0, len(self.years))
+        return slice(int(np.searchsorted(self.years, years[0], side='left')),
+                     int(np.searchsorted(self.years, years[1], side='right')))
+
+    # 0/1 weights over self.states of a resolved multi-state selection
+    def weights(self, selection):
+        weights = np.zeros(len(self.states))
+        weights[[self.state_pos[state] for state in selection]] = 1
+        return weights
+
+    # 0/1 weights over self.states of a resolved selection: 'All', a state or several states
+    def selection_weights(self, selection):
+        if isinstance(selection, str):
+            if selection == 'All':
+                return np.ones(len(self.states))
+            selection = [selection]
+        return self.weights(selection)
+
+    # Weights of 'All' (row 0) and of every state (row i + 1), for the tables computed
+    # for all of them in one pass
+    def weights_matrix(self):
+        return np.vstack([np.ones(len(self.states)), np.eye(len(self.states))])
+
+    # Row of a resolved selection in weights_matrix(), None for several or unknown states
+    def row_of(self, selection):
+        if not isinstance(selection, str):
+            return None
+        if selection == 'All':
+            return 0
+        s = self.state_pos.get(selection)
+        return None if s is None else s + 1
+
+    # Years and values of a metric for 'All', a single state or several states
+    # (over a resolved year range, all the years by default)
+    def series(self, state, metric, years=None):
+        m = self.metric_pos[metric]
+        y = self.year_slice(years)
+        if state == 'All':
+            mask = self.national_present[y]
+            return self.years[y][mask], self.national[y, m][mask]
+        if isinstance(state, str):
+            s = self.state_pos[state]
+            mask = self.present[s, y]
+            return self.years[y][mask], self.values[s, y, m][mask]
+        # Several states are summed in one matrix-vector reduction over the state axis
+        weights = self.weights(state)
+        mask = weights @ self.present[:, y] > 0
+        return self.years[y][mask], (weights @ self.values[:, y, m])[mask]
+
+    # Per-state series of a metric for several states (NaN where a state has no data)
+    def series_by_state(self, states, metric, years=None):
+        rows = [self.state_pos[state] for state in states]
+        y = self.year_slice(years)
+        values = np.where(self.present[rows, y], self.values[rows, y, self.metric_pos[metric]], np.nan)
+        return self.years[y], values
+
+    # Totals of every metric for every state over a resolved year range (states x metrics)
+    def range_totals(self, years=None):
+        if years is None:
+            return self.state_totals
+        y = self.year_slice(years)
+        return self.cumulative[:, y.stop] - self.cumulative[:, y.start]
+
+    # States with data over a resolved year range
+    def range_present(self, years=None):
+        y = self.year_slice(years)
+        return self.cumulative_present[:, y.stop] > self.cumulative_present[:, y.start]
+
+    # Total of a metric over a year range for 'All', a single state or several states
+    def total(self, state, metric, years=None):
+        m = self.metric_pos[metric]
+        totals = self.range_totals(years)
+        if state == 'All':
+            return totals[:, m].sum()
+        if isinstance(state, str):
+            if state not in self.state_pos:
+                return 0
+            return totals[self.state_pos[state], m]
+        return self.weights(state) @ totals[:, m]
+
+    # Totals of a metric over a year range for every state, aligned with self.states
+    def totals_by_state(self, metric, years=None):
+        return self.range_totals(years)[:, self.metric_pos[metric]]
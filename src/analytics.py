@@ -0,0 +1,133 @@
+# Statistics behind the insights of the dashboard, precomputed per snapshot
+# The correlations, rolling means and year-over-year changes of 'All' and of every
+# state are computed together on rows x years arrays taken from the cube, with
+# masks for the years without data, so adding states or metrics adds rows to the
+# same array passes instead of iterations of a Python loop.
+import numpy as np
+
+# Years of the rolling mean of the temperature anomalies
+ROLLING_YEARS = 5
+# Fewest years with data for a correlation
+MIN_YEARS = 3
+
+
+# Pearson correlation of every row of x and y over the cells where mask is set
+def pearson(x, y, mask):
+    n = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(mask, x, 0).sum(axis=1) / n
+        y_mean = np.where(mask, y, 0).sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, np.newaxis], 0)
+        dy = np.where(mask, y - y_mean[:, np.newaxis], 0)
+        r = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+    return np.where(n >= MIN_YEARS, r, np.nan)
+
+
+# Ranks (1 based, ties get their average rank) of every row over the cells where mask is set
+def ranks(values, mask):
+    size = values.shape[1]
+    order = np.argsort(np.where(mask, values, np.inf), axis=1, kind='stable')
+    ordered = np.take_along_axis(np.where(mask, values, np.inf), order, axis=1)
+    positions = np.broadcast_to(np.arange(size), ordered.shape)
+    # First and last position of the run of equal values every cell belongs to
+    starts = ordered[:, 1:] != ordered[:, :-1]
+    run_start = np.maximum.accumulate(np.where(np.hstack([np.ones((len(values), 1), bool), starts]),
+                                               positions, 0), axis=1)
+    run_end = np.minimum.accumulate(np.where(np.hstack([starts, np.ones((len(values), 1), bool)]),
+                                             positions, size - 1)[:, ::-1], axis=1)[:, ::-1]
+    result = np.empty(values.shape)
+    np.put_along_axis(result, order, (run_start + run_end) / 2 + 1, axis=1)
+    return result
+
+
+# Spearman rank correlation of every row of x and y over the cells where mask is set
+def spearman(x, y, mask):
+    return pearson(ranks(x, mask), ranks(y, mask), mask)
+
+
+# Mean of the last `window` cells with data of every row, NaN without data
+def rolling_mean(values, mask, window):
+    total = np.zeros((len(values), values.shape[1] + 1))
+    count = np.zeros(total.shape)
+    np.cumsum(np.where(mask, values, 0), axis=1, out=total[:, 1:])
+    np.cumsum(mask, axis=1, out=count[:, 1:])
+    start = np.maximum(np.arange(1, values.shape[1] + 1) - window, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (total[:, 1:] - total[:, start]) / (count[:, 1:] - count[:, start])
+
+
+# Percentage change of every cell from the previous year, NaN when either year has no data
+def year_over_year(values, mask):
+    change = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change[:, 1:] = np.where(mask[:, 1:] & mask[:, :-1], (values[:, 1:] - values[:, :-1]) / values[:, :-1] * 100,
+                                 np.nan)
+    return change
+
+
+class Analytics:
+    # Statistics of 'All' (row 0) and of every state of the cube, and of the
+    # national production against the temperature anomalies of the same years
+    def __init__(self, cube, temperature_data):
+        self.cube = cube
+        self.production, self.colonies, self.present = self._series(cube.weights_matrix())
+
+        # Production against colonies over the years, and their year-over-year changes
+        self.pearson = pearson(self.production, self.colonies, self.present)
+        self.spearman = spearman(self.production, self.colonies, self.present)
+        self.production_change = year_over_year(self.production, self.present)
+
+        # Production against colonies across the states (the bubble chart)
+        production = cube.state_totals[np.newaxis, :, cube.metric_pos['production']]
+        colonies = cube.state_totals[np.newaxis, :, cube.metric_pos['colonies_number']]
+        everywhere = np.ones(production.shape, dtype=bool)
+        self.state_pearson = float(pearson(production, colonies, everywhere)[0])
+        self.state_spearman = float(spearman(production, colonies, everywhere)[0])
+
+        # Temperature anomalies, their rolling mean and the years they share with the honey data
+        self.temperature_years = temperature_data['Year'].to_numpy()
+        anomalies = temperature_data['Value'].to_numpy(dtype=np.float64)[np.newaxis]
+        self.rolling_anomalies = rolling_mean(anomalies, np.ones(anomalies.shape, dtype=bool), ROLLING_YEARS)[0]
+        shared, temperature_pos, year_pos = np.intersect1d(self.temperature_years, cube.years, return_indices=True)
+        self.joined_years = shared
+        joined = np.broadcast_to(anomalies[:, temperature_pos], (len(self.production), len(shared)))
+        self.temperature_pearson = pearson(self.production[:, year_pos], joined, self.present[:, year_pos])
+
+    # Yearly production, colonies and presence of every row of weights (rows x states)
+    def _series(self, weights):
+        cube = self.cube
+        production = weights @ cube.values[:, :, cube.metric_pos['production']]
+        colonies = weights @ cube.values[:, :, cube.metric_pos['colonies_number']]
+        return production, colonies, (weights @ cube.present) > 0
+
+    # Correlations of the production with the colonies of a resolved selection over a resolved year range
+    def correlations(self, selection, years=None):
+        row = self.cube.row_of(selection)
+        if row is not None and years is None:
+            return self.pearson[row], self.spearman[row]
+        production, colonies, present = self._series(self.cube.selection_weights(selection)[np.newaxis])
+        y = self.cube.year_slice(years)
+        return (pearson(production[:, y], colonies[:, y], present[:, y])[0],
+                spearman(production[:, y], colonies[:, y], present[:, y])[0])
+
+    # National facts of the description: first and last production, the largest
+    # yearly drop measured from the peak before it and the mean production since
+    def headline(self):
+        years = self.cube.years
+        production = self.production[0]
+        present = np.flatnonzero(self.present[0])
+        first, last = present[0], present[-1]
+        drop = int(np.nanargmin(self.production_change[0]))
+        # Walk back from the year before the drop while the production was higher the year before
+        peak = drop - 1
+        while peak > first and production[peak - 1] > production[peak]:
+            peak -= 1
+        return {
+            'first_year': int(years[first]), 'first_production': production[first],
+            'last_year': int(years[last]), 'last_production': production[last],
+            'lowest': production[last] <= production[present].min(),
+            'peak_year': int(years[peak]), 'peak_production': production[peak],
+            'drop_year': int(years[drop]), 'drop_production': production[drop],
+            'drop': (production[peak] - production[drop]) / production[peak] * 100,
+            'mean_since_drop': production[drop + 1:last + 1][self.present[0, drop + 1:last + 1]].mean(),
+        }
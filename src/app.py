@@ -1,659 +1,835 @@
 # Import essential Python packages
-import pathlib
-import pandas as pd
+import time
+
+IMPORT_START = time.perf_counter()
+
+import gc
+import json
+import logging
+import os
+import sys
+import threading
 import numpy as np
 import dash
 import dash_bootstrap_components as dbc
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output
-import plotly.graph_objects as go
+from dash.dependencies import ClientsideFunction, Input, Output, State
+import background
+from cache_backends import CacheInvalidator, create_backend
+from clientside import series_payload
+from compression import ResponseCompression
+from data_access import database_path
+from data_snapshot import DataWatcher, SnapshotStore
+from figures import bar_figure, bubble_figure, line_figure, map_figure, temperature_figure
+from figure_cache import cached_figure, cached_result, warm_up
+from instrumentation import RequestInstrumentation, metrics, startup_phase, startup_report
+from prerender import PrerenderedResponses
+from rankings import RANKING_METRICS
+from regions import region_options
+from single_flight import SingleFlight
 
 # import plotly.express as px
 
+metrics.record_startup('import', time.perf_counter() - IMPORT_START)
+
+logger = logging.getLogger(__name__)
+
+# The Dash app, its server and the data are created by create_app() below, on the
+# first access to app.app or app.server when the module is imported (gunicorn app:server)
+
+# Sizes of the ranking chart, spelled out in its title
+NUMBER_WORDS = {3: 'Three', 5: 'Five', 10: 'Ten', 15: 'Fifteen', 20: 'Twenty'}
+# Controls of the ranking chart and their default values
+RANKING_CONTROLS = {'ranking-metric': 'production', 'ranking-size': 5, 'ranking-order': 'top'}
+
+# Clientside mode: the overview cards and line charts are computed in the browser
+# from per-state series stored in the page (see clientside.py and assets/clientside.js)
+CLIENTSIDE = os.environ.get('HONEY_CLIENTSIDE') == '1'
+
+# Background mode: the line charts, which compare the selected states, are computed
+# by a background callback in a separate process (see background.py) instead of the
+# dispatch callback. It needs diskcache and is left off in the clientside mode.
+BACKGROUND = os.environ.get('HONEY_BACKGROUND_CALLBACKS') == '1' and not CLIENTSIDE and background.available()
+
+# Data files
+HONEY_FILE = 'data/US_honey_dataset_updated.csv'
+TEMPERATURE_FILE = 'data/North_America_Temperature_Anomalies.csv'
+STATES_FILE = 'data/states.csv'
+
+# Cache of the serialized callback results, keyed on the dataset version
+# (in-process LRU, SQLite file or shared memory, see cache_backends)
+figure_cache = create_backend()
+
+# Concurrent requests of the same (callback, input, dataset version) wait for one computation,
+# and with HONEY_SINGLE_FLIGHT_LOCK_DIR the processes sharing a disk or shm cache do too
+single_flight = None
+if os.environ.get('HONEY_SINGLE_FLIGHT', '1') == '1':
+    single_flight = SingleFlight(lock_dir=os.environ.get('HONEY_SINGLE_FLIGHT_LOCK_DIR'))
+
+
+# Flask treats a value returned by a before_request hook as the response, so discard it
+def check_data_files():
+    cache_invalidator.check()
+
+
+def dataset_version():
+    return data_store.current().version
+
+
+# Callback timings and cache statistics in the Prometheus text format (per worker process)
+def metrics_endpoint():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+# The metrics do not load the data, the generation is 0 until it is loaded
+# The hits, misses and calls only grow, they are counters
+def cache_gauges():
+    stats = figure_cache.stats()
+    gauges = {'honey_cache_entries': stats['size'], 'honey_cache_hits_total': stats['hits'],
+              'honey_cache_misses_total': stats['misses'],
+              'honey_data_generation': data_store.current().generation if data_store.loaded() else 0}
+    if response_compression is not None:
+        stats = response_compression.stats()
+        gauges.update({'honey_response_cache_hits_total': stats['responses']['hits'],
+                       'honey_response_cache_misses_total': stats['responses']['misses'],
+                       'honey_compressed_cache_hits_total': stats['compressed']['hits'],
+                       'honey_not_modified_total': stats['not_modified']})
+    if single_flight is not None:
+        stats = single_flight.stats()
+        gauges.update({'honey_single_flight_calls_total': stats['calls'],
+                       'honey_single_flight_coalesced_total': stats['coalesced'],
+                       'honey_single_flight_process_coalesced_total': stats['process_coalesced'],
+                       'honey_single_flight_in_flight': stats['in_flight']})
+    if prerendered is not None:
+        stats = prerendered.stats()
+        gauges.update({'honey_prerendered_hits_total': stats['hits'],
+                       'honey_prerendered_misses_total': stats['misses'],
+                       'honey_prerendered_stale_total': stats['stale']})
+    return gauges
+
+
+metrics.add_collector(cache_gauges)
+
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-server = app.server
+# Canonical form of the dropdown value: 'All', a state or a tuple of states
+def resolve_selection(state_input):
+    return data_store.current().cube.resolve(state_input)
 
-# Read the data
 
-# US Honey datac
-honey_data = pd.read_csv('data/US_honey_dataset_updated.csv')
+# Canonical ranking controls (metric, size, order): missing or unknown values fall back to their defaults
+def resolve_ranking(metric, size, order):
+    if not isinstance(metric, str) or metric not in RANKING_METRICS:
+        metric = RANKING_CONTROLS['ranking-metric']
+    if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+        size = RANKING_CONTROLS['ranking-size']
+    if order not in ('top', 'bottom'):
+        order = RANKING_CONTROLS['ranking-order']
+    return metric, size, order
 
-# North America Temperature Anomalies data
-temperature_data = pd.read_csv('data/North_America_Temperature_Anomalies.csv')
 
-# List of all the states
-states = list(honey_data['state'].unique())
-states.insert(0, 'All')
+# Canonical form of the year slider value: None for all the years or (first, last)
+def resolve_years(year_range):
+    return data_store.current().cube.resolve_years(year_range)
 
 
 # Line Function for the line plots
 # Building the production overtime graph
-def line_plots(input_states, year_col, target_col, the_title, y_axis, x_axis):
-    if input_states == 'All':
-        # Calculate for all the states
-        target = honey_data.groupby(year_col)[[target_col]].sum().reset_index()
-        # Calculations for the percentage change
-        first_value = int(target.loc[
-                              target[year_col] == target[year_col].min(), target_col
-                          ])
-        last_value = int(target.loc[
-                             target[year_col] == target[year_col].max(), target_col
-                         ])
-
-        # Production overtime figure
-        target_fig = go.Figure()
-        # Production overtime line plot
-        target_fig.add_trace(go.Scatter(x=target[year_col],
-                                        y=target[target_col],
-                                        line=dict(color='#D9560B', width=3), connectgaps=True))
-        # Graph marker
-        target_fig.add_trace(go.Scatter(x=[target[year_col].max()],
-                                        y=[int(target.loc[
-                                                   target[year_col] == target[
-                                                       year_col].max(),
-                                                   target_col
-                                               ])],
-                                        mode='markers',
-                                        marker=dict(color='#D9560B', size=10)))
-        target_fig.update_layout(title=dict(
-            text=the_title,
-            font=dict(size=20, color='#0C0B09')
+# The percentage change is taken from the first and last values of the year range
+def line_plots(input_states, year_col, target_col, the_title, y_axis, x_axis, year_range=None):
+    honey_cube = data_store.current().cube
+    # Slice the yearly series of 'All', a specific state or the sum of several states from the cube
+    years, values = honey_cube.series(input_states, target_col, year_range)
+    # Thin line for each of the compared states
+    comparisons = []
+    if isinstance(input_states, tuple):
+        state_years, state_values = honey_cube.series_by_state(input_states, target_col, year_range)
+        comparisons = [(state, state_years, state_row) for state, state_row in zip(input_states, state_values)]
+
+    return line_figure(years, values, the_title, y_axis, x_axis, comparisons)
+
+
+# Description of the national production, from the facts computed on the data
+def description_text(facts):
+    return ('Since {first_year}, the U.S. has experienced a significant decrease in honey production, from '
+            '{first:.0f} million to {last:.0f} million pounds in {last_year}{record}. The quantity produced has been '
+            'fluctuating and gradually decreased from {first_year} to {peak_year}. However, due to honey bee diseases '
+            'in {peak_year}, there was a sharp drop in the following years, from {peak:.0f} million to {bottom:.0f} '
+            'million pounds in {drop_year}, or a {drop:.1f}% drop. Since then, production has remained low, and the '
+            'average pounds was about {mean:.0f} million pounds per year.').format(
+        first=facts['first_production'] / 1e6, last=facts['last_production'] / 1e6,
+        peak=facts['peak_production'] / 1e6, bottom=facts['drop_production'] / 1e6,
+        mean=facts['mean_since_drop'] / 1e6,
+        record=', which also marks the lowest production level ever recorded' if facts['lowest'] else '',
+        **facts)
+
+
+# Progress of the background computation of the line charts, shown while it runs
+def comparison_progress():
+    if not BACKGROUND:
+        return []
+    return [html.Progress(id='comparison-progress', value='0', max=str(len(line_outputs)),
+                          style={'width': '100%', 'visibility': 'hidden'})]
+
+
+# The layout is built on every page load so the dropdown follows the data snapshot
+def serve_layout():
+    years = data_store.current().cube.years
+    analytics = data_store.current().analytics
+    first_year, last_year = int(years[0]), int(years[-1])
+    layout = html.Div(children=[
+        # The title section
+        dbc.Row(
+            dbc.Col(
+                html.Div('United States Honey Production',
+                         style={'font-size': '60px', 'font-family': 'Merriweather', 'font-weight': 'bold',
+                                'margin-top': '50px', 'color': 'white'}),
+                width={'size': 10, 'offset': 1},
+                style={'background-color': '#A63F03', 'padding': '0 0 0 50px'},
+                xs=8, sm=8, md=8, lg=10, xl=10
+            ), justify='center'
         ),
-            xaxis_title=dict(
-                text=x_axis,
-                font=dict(size=14, color='#595959')
-            ), yaxis_title=dict(
-                text=y_axis,
-                font=dict(size=14, color='#595959')
-            ),
-            plot_bgcolor='white',
-            showlegend=False,
-            xaxis=dict(
-                showline=True,
-                showgrid=False,
-                showticklabels=True,
-                linecolor='#D9D9D9',
-                linewidth=2,
-                ticks='outside',
-                tickcolor='#595959',
-                tickfont=dict(
-                    color='#595959'
-                )
-            ),
-            yaxis=dict(
-                showline=True,
-                showgrid=False,
-                showticklabels=True,
-                linecolor='#D9D9D9',
-                linewidth=2,
-                tickfont=dict(
-                    color='#595959'
-                )
-            ))
-        # Annotation
-        target_fig.add_annotation(x=target['year'].max() + 2,
-                                  y=int(target.loc[
-                                            target['year'] == target[
-                                                'year'].max(),
-                                            target_col
-                                        ]),
-                                  text='{}%'.format(
-                                      round(((last_value - first_value) / first_value) * 100, 1)
-                                  ),
-                                  showarrow=False,
-                                  font=dict(size=14, color='#D9560B')
-                                  )
-
-        return target_fig
-
-    else:
-        # Calculate for a specific state
-        target = honey_data.loc[honey_data['state'] == input_states].groupby(year_col)[
-            [target_col]].sum().reset_index()
-        # Calculate for the percentage change
-        first_value = int(target.loc[
-                              target[year_col] == target[year_col].min(), target_col
-                          ])
-        last_value = int(target.loc[
-                             target[year_col] == target[year_col].max(), target_col
-                         ])
-
-        # Production overtime figure
-        target_fig = go.Figure()
-        # Production overtime line plot
-        target_fig.add_trace(go.Scatter(x=target[year_col],
-                                        y=target[target_col],
-                                        line=dict(color='#D9560B', width=3), connectgaps=True))
-        # Graph marker
-        target_fig.add_trace(go.Scatter(x=[target[year_col].max()],
-                                        y=[int(target.loc[
-                                                   target[year_col] == target[
-                                                       year_col].max(),
-                                                   target_col
-                                               ])],
-                                        mode='markers',
-                                        marker=dict(color='#D9560B', size=10)))
-        target_fig.update_layout(title=dict(
-            text=the_title,
-            font=dict(size=20, color='#0C0B09')
+        # Horizontal line separating the title and the description
+        dbc.Row(dbc.Col(html.Hr(),
+                        width={'size': 10, 'offset': 1},
+                        style={'background-color': '#A63F03', 'color': 'white'},
+                        xs=8, sm=8, md=8, lg=10, xl=10
+                        ), justify='center'
+                ),
+        # Description section of the report
+        dbc.Row(
+            dbc.Col(
+                html.Div([
+                    html.P(description_text(analytics.headline()))
+                ], style={'color': 'white'}),
+                width={'size': 10, 'offset': 1},
+                style={'background-color': '#A63F03', 'padding': '0 50px 20px 50px'},  # padding [top right bottom left]
+                xs=8, sm=8, md=8, lg=10, xl=10
+            ), justify='center'
         ),
-            xaxis_title=dict(
-                text=x_axis,
-                font=dict(size=14, color='#595959')
-            ), yaxis_title=dict(
-                text=y_axis,
-                font=dict(size=14, color='#595959')
-            ),
-            plot_bgcolor='white',
-            showlegend=False,
-            xaxis=dict(
-                showline=True,
-                showgrid=False,
-                showticklabels=True,
-                linecolor='#D9D9D9',
-                linewidth=2,
-                ticks='outside',
-                tickcolor='#595959',
-                tickfont=dict(
-                    color='#595959'
-                )
+        html.Br(),
+        # The overview section
+        dbc.Row([
+            # Total Production Overview
+            dbc.Col([
+                html.Div('Total Production'),
+                html.Div(id='total-production', style={'font-size': '28px', 'font-weight': 'bold'})
+            ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
+                      'text-align': 'center', 'border-radius': '12px 0 0 12px'},
+                width={'size': 2, 'offset': 1},
+                xs=8, sm=8, md=8, lg=2, xl=2),
+            # Colonies Number Overview
+            dbc.Col([
+                html.Div('Total Number of Colonies'),
+                html.Div(id='total-colonies', style={'font-size': '28px', 'font-weight': 'bold'})
+            ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
+                      'text-align': 'center'},
+                width={'size': 2},
+                xs=8, sm=8, md=8, lg=2, xl=2),
+            # Total Stock Overview
+            dbc.Col([
+                html.Div('Total Stocks'),
+                html.Div(id='total-stock', style={'font-size': '28px', 'font-weight': 'bold'})
+            ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
+                      'text-align': 'center'},
+                width={'size': 2},
+                xs=8, sm=8, md=8, lg=2, xl=2),
+            # Value of Production Overview
+            dbc.Col([
+                html.Div('Total Value of Production'),
+                html.Div(id='total-value-production', style={'font-size': '28px', 'font-weight': 'bold'})
+            ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
+                      'text-align': 'center', 'border-radius': '0 12px 12px 0'},
+                width={'size': 2},
+                xs=8, sm=8, md=8, lg=6, xl=2),
+            # State and dropdown
+            dbc.Col([
+                html.Div('Choose a State: ', style={'margin-right': '10px', 'margin-bottom': '10px'}),
+                html.Div(dcc.Dropdown(
+                    id='input-state',
+                    options=[{'label': i, 'value': i} for i in
+                             data_store.current().states[:1] + region_options() + data_store.current().states[1:]],
+                    value=['All'],
+                    multi=True
+                ), style={'width': '100%', 'margin-right': '10px'})
+            ], style={'background-color': '#F2F2F2',
+                      'padding': '20px 0 0 20px'},
+                width={'size': 2},
+                xs=8, sm=8, md=8, lg=2, xl=2),
+        ], justify='center'),
+        # Trends of the selection
+        dbc.Row([
+            dbc.Col([
+                html.Span('Production change from the first to the last year: '),
+                html.Span(id='production-change', style={'font-weight': 'bold'})
+            ], width={'size': 3, 'offset': 1}, xs=8, sm=8, md=8, lg=3, xl=3),
+            dbc.Col([
+                html.Span('Mean yield per colony: '),
+                html.Span(id='yield-per-colony', style={'font-weight': 'bold'})
+            ], width={'size': 3}, xs=8, sm=8, md=8, lg=3, xl=3),
+            dbc.Col([
+                html.Span('Price trend: '),
+                html.Span(id='price-trend', style={'font-weight': 'bold'})
+            ], width={'size': 4}, xs=8, sm=8, md=8, lg=4, xl=4),
+            dbc.Col([
+                html.Span('Correlation of the production with the colonies over the years: '),
+                html.Span(id='colonies-correlation', style={'font-weight': 'bold'})
+            ], width={'size': 10, 'offset': 1}, xs=8, sm=8, md=8, lg=10, xl=10),
+        ], justify='center', style={'color': '#A63F03', 'padding-top': '10px'}),
+        # Year range of every figure but the temperature anomalies
+        dbc.Row(
+            dbc.Col(
+                dcc.RangeSlider(
+                    id=YEAR_CONTROL,
+                    min=first_year,
+                    max=last_year,
+                    step=1,
+                    value=[first_year, last_year],
+                    marks={int(year): str(year) for year in range(first_year, last_year + 1, 5)},
+                    tooltip={'placement': 'bottom'}
+                ),
+                width={'size': 10, 'offset': 1},
+                xs=8, sm=8, md=8, lg=10, xl=10
+            ), justify='center', style={'padding-top': '20px'}
+        ),
+        html.Br(),
+
+        # Row 1 for the viz
+        dbc.Row([
+            # First Column
+            dbc.Col(comparison_progress() + [
+                # Total Production overtime plot
+                html.Div(dcc.Graph(id='production-overtime')),
+                # Number of colonies overtime plot
+                html.Div(dcc.Graph(id='colonies-number'))
+            ],
+                width={'size': 5, 'offset': 1},
+                xs=8, sm=8, md=8, lg=5, xl=5
             ),
-            yaxis=dict(
-                showline=True,
-                showgrid=False,
-                showticklabels=True,
-                linecolor='#D9D9D9',
-                linewidth=2,
-                tickfont=dict(
-                    color='#595959'
-                )
-            ))
-        # Annotation
-        target_fig.add_annotation(x=target[year_col].max() + 2,
-                                  y=int(target.loc[
-                                            target[year_col] == target[
-                                                year_col].max(), target_col
-                                        ]),
-                                  text='{}%'.format(
-                                      round(((last_value - first_value) / first_value) * 100, 1)
-                                  ),
-                                  showarrow=False,
-                                  font=dict(size=14, color='#D9560B')
-                                  )
-
-        return target_fig
-
-
-app.layout = html.Div(children=[
-    # The title section
-    dbc.Row(
-        dbc.Col(
-            html.Div('United States Honey Production',
-                     style={'font-size': '60px', 'font-family': 'Merriweather', 'font-weight': 'bold',
-                            'margin-top': '50px', 'color': 'white'}),
-            width={'size': 10, 'offset': 1},
-            style={'background-color': '#A63F03', 'padding': '0 0 0 50px'},
-            xs=8, sm=8, md=8, lg=10, xl=10
-        ), justify='center'
-    ),
-    # Horizontal line separating the title and the description
-    dbc.Row(dbc.Col(html.Hr(),
-                    width={'size': 10, 'offset': 1},
-                    style={'background-color': '#A63F03', 'color': 'white'},
-                    xs=8, sm=8, md=8, lg=10, xl=10
-                    ), justify='center'
+            # Second Column
+            dbc.Col([
+                # Controls of the ranking chart
+                dbc.Row([
+                    dbc.Col(dcc.Dropdown(
+                        id='ranking-metric',
+                        options=[{'label': label, 'value': metric} for metric, label in RANKING_METRICS.items()],
+                        value=RANKING_CONTROLS['ranking-metric'],
+                        clearable=False
+                    ), width=6),
+                    dbc.Col(dcc.Dropdown(
+                        id='ranking-size',
+                        options=[{'label': str(size), 'value': size} for size in NUMBER_WORDS],
+                        value=RANKING_CONTROLS['ranking-size'],
+                        clearable=False
+                    ), width=2),
+                    dbc.Col(dcc.RadioItems(
+                        id='ranking-order',
+                        options=[{'label': ' Top', 'value': 'top'}, {'label': ' Bottom', 'value': 'bottom'}],
+                        value=RANKING_CONTROLS['ranking-order'],
+                        inline=True,
+                        inputStyle={'margin-left': '10px'}
+                    ), width=4)
+                ], align='center'),
+                # Total Production by states map
+                dbc.Row([
+                    dbc.Col(html.Div(dcc.Graph(id='top-production')))
+                ]),
+                # Total Production by states bar-chart
+                dbc.Row([
+                    dbc.Col(html.Div(dcc.Graph(id='production-on-map')))
+                ])
+            ],
+                width={'size': 5},
+                xs=8, sm=8, md=8, lg=5, xl=5
+            )
+        ], justify='center'),
+        html.Br(),
+        html.Br(),
+        # Row 2 for viz
+        dbc.Row([
+            # Bubble plot
+            dbc.Col([
+                html.H2('Number of Colonies and Production',
+                        style={'font-family': 'Merriweather'}),
+                html.Div("""There is a strong relationship between the number of colonies that a state has with the total
+                    production values. As the number of colonies increases so is the total production of honey. The
+                    correlation value is of {:.2f} (Spearman rank correlation of {:.2f}).
+                    """.format(analytics.state_pearson, analytics.state_spearman)),
+                html.Br(),
+                html.Div(dcc.Graph(id='production-colonies'))
+            ],
+                width={'size': 5, 'offset': 1},
+                xs=8, sm=8, md=8, lg=5, xl=5
             ),
-    # Description section of the report
-    dbc.Row(
-        dbc.Col(
-            html.Div([
-                html.P("""Since 1994, the U.S. has experienced a significant decrease in honey production, from 210 
-                million to 23 million pounds in 2021, which also marks the lowest production level ever recorded. The 
-                quantity produced has been fluctuating and gradually decreased from 1994 to 2008. However, 
-                due to honey bee diseases in 2008, there was a sharp drop in the following years (2009 and 2010), 
-                from 160 million to 44 million pounds in 2010, or a 72.0187% drop. Since then, production has 
-                remained low, and the average pounds was about 35 million pounds per year.""")
-            ], style={'color': 'white'}),
-            width={'size': 10, 'offset': 1},
-            style={'background-color': '#A63F03', 'padding': '0 50px 20px 50px'},  # padding [top right bottom left]
-            xs=8, sm=8, md=8, lg=10, xl=10
-        ), justify='center'
-    ),
-    html.Br(),
-    # The overview section
-    dbc.Row([
-        # Total Production Overview
-        dbc.Col([
-            html.Div('Total Production'),
-            html.Div(id='total-production', style={'font-size': '28px', 'font-weight': 'bold'})
-        ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
-                  'text-align': 'center', 'border-radius': '12px 0 0 12px'},
-            width={'size': 2, 'offset': 1},
-            xs=8, sm=8, md=8, lg=2, xl=2),
-        # Colonies Number Overview
-        dbc.Col([
-            html.Div('Total Number of Colonies'),
-            html.Div(id='total-colonies', style={'font-size': '28px', 'font-weight': 'bold'})
-        ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
-                  'text-align': 'center'},
-            width={'size': 2},
-            xs=8, sm=8, md=8, lg=2, xl=2),
-        # Total Stock Overview
-        dbc.Col([
-            html.Div('Total Stocks'),
-            html.Div(id='total-stock', style={'font-size': '28px', 'font-weight': 'bold'})
-        ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
-                  'text-align': 'center'},
-            width={'size': 2},
-            xs=8, sm=8, md=8, lg=2, xl=2),
-        # Value of Production Overview
-        dbc.Col([
-            html.Div('Total Value of Production'),
-            html.Div(id='total-value-production', style={'font-size': '28px', 'font-weight': 'bold'})
-        ], style={'background-color': '#D9D9D9', 'padding': '20px 0', 'color': '#A63F03',
-                  'text-align': 'center', 'border-radius': '0 12px 12px 0'},
-            width={'size': 2},
-            xs=8, sm=8, md=8, lg=6, xl=2),
-        # State and dropdown
-        dbc.Col([
-            html.Div('Choose a State: ', style={'margin-right': '10px', 'margin-bottom': '10px'}),
-            html.Div(dcc.Dropdown(
-                id='input-state',
-                options=[{'label': i, 'value': i} for i in states],
-                value='All'
-                # multi=True
-            ), style={'width': '100%', 'margin-right': '10px'})
-        ], style={'background-color': '#F2F2F2',
-                  'padding': '20px 0 0 20px'},
-            width={'size': 2},
-            xs=8, sm=8, md=8, lg=2, xl=2),
-    ], justify='center'),
-    html.Br(),
-
-    # Row 1 for the viz
-    dbc.Row([
-        # First Column
-        dbc.Col([
-            # Total Production overtime plot
-            html.Div(dcc.Graph(id='production-overtime')),
-            # Number of colonies overtime plot
-            html.Div(dcc.Graph(id='colonies-number'))
-        ],
-            width={'size': 5, 'offset': 1},
-            xs=8, sm=8, md=8, lg=5, xl=5
-        ),
-        # Second Column
-        dbc.Col([
-            # Total Production by states map
-            dbc.Row([
-                dbc.Col(html.Div(dcc.Graph(id='top-production')))
-            ]),
-            # Total Production by states bar-chart
-            dbc.Row([
-                dbc.Col(html.Div(dcc.Graph(id='production-on-map')))
-            ])
-        ],
-            width={'size': 5},
-            xs=8, sm=8, md=8, lg=5, xl=5
-        )
-    ], justify='center'),
-    html.Br(),
-    html.Br(),
-    # Row 2 for viz
-    dbc.Row([
-        # Bubble plot
-        dbc.Col([
-            html.H2('Number of Colonies and Production',
-                    style={'font-family': 'Merriweather'}),
-            html.Div("""There is a strong relationship between the number of colonies that a state has with the total
-                production values. As the number of colonies increases so is the total production of honey. The
-                correlation value is of 0.99, which is almost 1.
-                """),
-            html.Br(),
-            html.Div(dcc.Graph(id='production-colonies'))
-        ],
-            width={'size': 5, 'offset': 1},
-            xs=8, sm=8, md=8, lg=5, xl=5
-        ),
-        # Heat Anomalies plot
-        dbc.Col([
-            html.H2('The Effect of Rising Temperatures',
-                    style={'font-family': 'Merriweather'}),
-            html.Div("""The preferred temperature range for Honey bees to maintain their hives is 32-36C (
-            89.6-96.8F). Honey bee larvae will not develop and can die when exposed to temperatures outside this 
-            range. Climate change has affected the whole planet earth."""),
-            html.Br(),
-            html.Div(dcc.Graph(id='temperature-anomalies'))
-        ],
-            width={'size': 5},
-            xs=8, sm=8, md=8, lg=5, xl=5
-        )
-    ], justify='center'),
-    # Line breaks
-    html.Br(),
-    html.Br(),
-    html.Br(),
-    dbc.Row(dbc.Col(html.Hr(),
-                    width={'size': 10, 'offset': 1},
-                    style={'background-color': '#A63F03', 'color': 'white'})),
-    dbc.Row(
-        dbc.Col(
-            html.Div([
-                html.P("""The footer""")
-            ], style={'color': 'white'}),
-            width={'size': 10, 'offset': 1},
-            style={'background-color': '#A63F03', 'text-align': 'center',
-                   'padding': '50px 50px 50px 50px'}  # padding [top right bottom left]
+            # Heat Anomalies plot
+            dbc.Col([
+                html.H2('The Effect of Rising Temperatures',
+                        style={'font-family': 'Merriweather'}),
+                html.Div("""The preferred temperature range for Honey bees to maintain their hives is 32-36C (
+                89.6-96.8F). Honey bee larvae will not develop and can die when exposed to temperatures outside this 
+                range. Climate change has affected the whole planet earth. From {} to {}, the correlation between
+                the US honey production and the temperature anomaly of the year is of {:.2f}.""".format(
+                    analytics.joined_years[0], analytics.joined_years[-1], analytics.temperature_pearson[0])),
+                html.Br(),
+                html.Div(dcc.Graph(id='temperature-anomalies'))
+            ],
+                width={'size': 5},
+                xs=8, sm=8, md=8, lg=5, xl=5
+            )
+        ], justify='center'),
+        # Line breaks
+        html.Br(),
+        html.Br(),
+        html.Br(),
+        dbc.Row(dbc.Col(html.Hr(),
+                        width={'size': 10, 'offset': 1},
+                        style={'background-color': '#A63F03', 'color': 'white'})),
+        dbc.Row(
+            dbc.Col(
+                html.Div([
+                    html.P("""The footer""")
+                ], style={'color': 'white'}),
+                width={'size': 10, 'offset': 1},
+                style={'background-color': '#A63F03', 'text-align': 'center',
+                       'padding': '50px 50px 50px 50px'}  # padding [top right bottom left]
+            )
         )
-    )
-], style={'background-color': '#F2F2F2'})
+    ], style={'background-color': '#F2F2F2'})
+
+    # Per-state series for the clientside callbacks
+    if CLIENTSIDE:
+        layout.children.append(dcc.Store(id='state-series', data=client_payload(None)))
+
+    return layout
 
 
 # Callback function definition
-@app.callback([
-    Output(component_id='total-production', component_property='children'),
-    Output(component_id='total-colonies', component_property='children'),
-    Output(component_id='total-stock', component_property='children'),
-    Output(component_id='total-value-production', component_property='children')
-],
-    Input(component_id='input-state', component_property='value'))
+@cached_result(figure_cache, 'overview', dataset_version, key_func=resolve_selection, flight=single_flight)
 # Add computation to callback function and return values
-def overview(state_input):
-    if state_input == 'All':
-        # Calculate the stat for all the states
-        total_production = honey_data['production'].sum()
-        total_colonies = honey_data['colonies_number'].sum()
-        total_stocks = honey_data['stocks'].sum()
-        total_value_production = honey_data['value_of_production'].sum()
-
-        return ['{:,}M'.format(round(total_production / 1000000, 1)),
-                '{:,}M'.format(round(total_colonies / 1000000, 1)),
-                '{:,}M'.format(round(total_stocks / 1000000, 1)),
-                '{:,}M'.format(round(total_value_production / 1000000, 1))]
-    else:
-        # Calculate the stats for an individual state
-        total_production = honey_data.loc[honey_data['state'].isin([state_input]), 'production'].sum()
-        total_colonies = honey_data.loc[honey_data['state'].isin([state_input]), 'colonies_number'].sum()
-        total_stocks = honey_data.loc[honey_data['state'].isin([state_input]), 'stocks'].sum()
-        total_value_production = honey_data.loc[honey_data['state'].isin([state_input]), 'value_of_production'].sum()
+def overview(state_input, years=None):
+    # Totals for 'All', an individual state or several states, read from the KPI table
+    kpis = data_store.current().kpis.lookup(resolve_selection(state_input), years)
+
+    return [kpis['total_production'], kpis['total_colonies'], kpis['total_stocks'],
+            kpis['total_value_production']]
 
-        return ['{:,}M'.format(round(total_production / 1000000, 1)),
-                '{:,}M'.format(round(total_colonies / 1000000, 1)),
-                '{:,}M'.format(round(total_stocks / 1000000, 1)),
-                '{:,}M'.format(round(total_value_production / 1000000, 1))]
+
+# Callback for the trends under the overview cards
+@cached_result(figure_cache, 'trends', dataset_version, key_func=resolve_selection, flight=single_flight)
+def trends(state_input, years=None):
+    selection = resolve_selection(state_input)
+    kpis = data_store.current().kpis.lookup(selection, years)
+    pearson, spearman = data_store.current().analytics.correlations(selection, years)
+    correlation = 'n/a' if np.isnan(pearson) else '{:.2f} (Spearman {:.2f})'.format(
+        pearson, spearman)
+
+    return [kpis['production_change'], kpis['yield_per_colony'], kpis['price_trend'], correlation]
 
 
 # Callback for production overtime graph
-@app.callback(Output(component_id='production-overtime', component_property='figure'),
-              Input(component_id='input-state', component_property='value'))
+@cached_figure(figure_cache, 'production_overtime_graph', dataset_version, key_func=resolve_selection,
+               flight=single_flight)
 # Building the production overtime graph
-def production_overtime_graph(state_input):
-    return line_plots(state_input, 'year', 'production', 'US Honey Production by Year', 'Total Production', 'Year')
+def production_overtime_graph(state_input, years=None):
+    return line_plots(resolve_selection(state_input), 'year', 'production', 'US Honey Production by Year',
+                      'Total Production', 'Year', years)
 
 
 # Callback for Number of colonies graph
-@app.callback(Output(component_id='colonies-number', component_property='figure'),
-              Input(component_id='input-state', component_property='value'))
+@cached_figure(figure_cache, 'colonies_number_graph', dataset_version, key_func=resolve_selection, flight=single_flight)
 # Function for Number of colonies graph
-def colonies_number_graph(state_input):
-    return line_plots(state_input, 'year', 'colonies_number', 'Total Colonies Over time', 'Total Colonies', 'Year')
+def colonies_number_graph(state_input, years=None):
+    return line_plots(resolve_selection(state_input), 'year', 'colonies_number', 'Total Colonies Over time',
+                      'Total Colonies', 'Year', years)
+
+
+# Payload of the 'state-series' store for the clientside mode
+@cached_result(figure_cache, 'client_payload', dataset_version, ignore_input=True, flight=single_flight)
+def client_payload(state_input):
+    # Layouts of the line charts, taken from the server-side figures
+    line_layouts = {}
+    for metric, figure in [('production', production_overtime_graph.uncached('All')),
+                           ('colonies_number', colonies_number_graph.uncached('All'))]:
+        layout = dict(figure['layout'])
+        layout.pop('annotations', None)
+        line_layouts[metric] = layout
+    return series_payload(data_store.current().cube, line_layouts)
 
 
 # Callback for total production by state on map
-@app.callback(Output(component_id='production-on-map', component_property='figure'),
-              Input(component_id='input-state', component_property='value'))
+@cached_figure(figure_cache, 'production_map', dataset_version, key_func=resolve_selection, flight=single_flight)
 # Function for total production by state on map
-def production_map(state_input):
-    # Latitude and Longitude of US States
-    states_lat_long = pd.read_csv('data/states.csv')
-
-    # The data
-    us_map = honey_data.groupby('state')[['production']].sum().reset_index()
-    # Merge the data
-    us_map = us_map.merge(states_lat_long, left_on='state', right_on='state_name')
-    # Drop some state_name column
-    us_map.drop('state_name', axis=1, inplace=True)
-    # Rename columns
-    us_map.rename(columns={'state_x': 'state', 'state_y': 'code'}, inplace=True)
-
-    if state_input == 'All':
-        # The map
-        us_map_fig = go.Figure(data=go.Choropleth(
-            locations=us_map['code'],
-            z=us_map['production'],
-            locationmode='USA-states',
-            colorscale='Oranges',
-            text=us_map['state']
-        ))
-
-        us_map_fig.update_layout(
-            title=dict(
-                text='Total Honey Production States by States',
-                font=dict(size=20, color='#0C0B09')
-            ),
-            geo_scope='usa',
-            margin={"r": 0, "t": 30, "l": 0, "b": 0}
-        )
+def production_map(state_input, years=None):
+    state_input = resolve_selection(state_input)
+    # Pre-merged map columns for 'All' or the selected state, totals of the year range
+    codes, production, names = data_store.current().map_table.select(state_input, years)
 
-        return us_map_fig
-    else:
-        us_map = us_map.loc[us_map['state'] == state_input]
-
-        # The map
-        us_map_fig = go.Figure(data=go.Choropleth(
-            locations=us_map['code'],
-            z=us_map['production'],
-            locationmode='USA-states',
-            colorscale='Oranges',
-            text=us_map['state'],
-            showscale=False
-        ))
-
-        us_map_fig.update_layout(
-            title=dict(
-                text='Total Honey Production States by States',
-                font=dict(size=20, color='#0C0B09')
-            ),
-            geo_scope='usa',
-            margin={"r": 0, "t": 30, "l": 0, "b": 0}
-        )
-
-        return us_map_fig
+    # The map (the colour scale is only shown with all the states)
+    return map_figure(codes, production, names, showscale=None if state_input == 'All' else False)
 
 
 # Callback for top production by states
-@app.callback(Output(component_id='top-production', component_property='figure'),
-              Input(component_id='input-state', component_property='value'))
+@cached_figure(figure_cache, 'top_production_graph', dataset_version, key_func=resolve_selection, flight=single_flight)
 # Function for top production by states
-def top_production_graph(state_input):
-    if state_input == 'All':
-        top_production = honey_data.groupby('state')[
-            ['production']].sum().reset_index().sort_values('production', ascending=False).head()
-        top_production = top_production.sort_values('production', ascending=True)
-
-        top_production_fig = go.Figure()
-        top_production_fig.add_trace(go.Bar(x=top_production['production'], y=top_production['state'],
-                                            marker=dict(color=['#B4BEC9', '#B4BEC9', '#B4BEC9', '#D9560B', '#D9560B']),
-                                            name='Top Five Honey Production States',
-                                            orientation='h',
-                                            text=['{:,}M'.format(round(i / 1000000, 1)) for i in
-                                                  top_production['production']],
-                                            textfont=dict(color='white', size=14),
-                                            textposition='inside')  # more ['inside', 'outside', 'none']
-                                     )
-
-        top_production_fig.update_layout(
-            title=dict(
-                text='Top Five Honey Production States',
-                font=dict(size=20, color='#0C0B09')
-            ),
-            xaxis_title=dict(
-                text='Total Production',
-                font=dict(size=14, color='#595959')
-            ),
-            xaxis=dict(
-                showline=True,
-                showgrid=False,
-                showticklabels=True,
-                linecolor='#D9D9D9',
-                linewidth=2,
-                ticks='outside',
-                tickcolor='#595959',
-                tickfont=dict(
-                    color='#595959'
-                )
-            ),
-            yaxis=dict(
-                showline=False,
-                showgrid=False,
-                showticklabels=True,
-                linecolor='#D9D9D9',
-                linewidth=2,
-                tickfont=dict(
-                    color='#595959'
-                )
-            ),
-            plot_bgcolor='white'
-        )
+# The n first (or last) states of a metric, read from the presorted ranking index.
+# The selected states are highlighted with their rank, and added below the bars
+# when they are outside of the ranking.
+def top_production_graph(state_input, metric='production', size=5, order='top', years=None):
+    state_input = resolve_selection(state_input)
+    rankings = data_store.current().rankings
+    bottom = order == 'bottom'
+    states, values = rankings.query(metric, size, years, bottom)
+    states, values = list(states), list(values)
+    labels = list(states)
+    highlight = None
+    if state_input != 'All':
+        selection = [state_input] if isinstance(state_input, str) else list(state_input)
+        ranks = [(rankings.rank_of(metric, state, years), state) for state in selection]
+        highlight = set()
+        for rank, state in sorted(rank for rank in ranks if rank[0] is not None):
+            label = '{} (#{})'.format(state, rank)
+            if state in states:
+                labels[states.index(state)] = label
+            else:
+                labels.append(label)
+                values.append(rankings.value_of(metric, state, years))
+            highlight.add(label)
+
+    title = ranking_title(metric, size, bottom)
+    if metric == 'yield_per_colony':
+        text = ['{:.1f} lbs'.format(value) for value in values]
+    else:
+        text = None
+    # Horizontal bars are drawn from the bottom, so the first of the ranking goes last
+    return bar_figure(labels[::-1], values[::-1], title, RANKING_METRICS[metric],
+                      text=text[::-1] if text is not None else None, highlight=highlight)
 
-        return top_production_fig
+
+# Title of the ranking chart, 'Top Five Honey Production States' by default
+def ranking_title(metric, size, bottom):
+    count = NUMBER_WORDS.get(size, size)
+    direction = 'Bottom' if bottom else 'Top'
+    if metric == 'production':
+        return '{} {} Honey Production States'.format(direction, count)
+    return '{} {} States by {}'.format(direction, count, RANKING_METRICS[metric])
 
 
 # Production vs Colonies Number Callback
-@app.callback(Output(component_id='production-colonies', component_property='figure'),
-              Input(component_id='input-state', component_property='value'))
+@cached_figure(figure_cache, 'production_colonies_graph', dataset_version, ignore_input=True, flight=single_flight)
 # Function Production vs Colonies Number Graph
-def production_colonies_graph(state_input):
-    production_colonies = honey_data.groupby('state')[['production', 'colonies_number']].sum().reset_index()
-
-    # The size of the dots
-    size = production_colonies['production'] + production_colonies['colonies_number']
-
-    # Plot
-    production_colonies_fig = go.Figure(data=[go.Scatter(
-        x=production_colonies['production'],
-        y=production_colonies['colonies_number'],
-        mode='markers',
-        text=production_colonies['state'],
-        marker=dict(
-            size=size,
-            sizemode='area',
-            sizeref=2. * max(size) / (70. ** 2),
-            color='#D9560B'
-        )
-    )])
-
-    production_colonies_fig.update_layout(title=dict(
-        text='Production vs Number of Colonies by States',
-        font=dict(size=20, color='#0C0B09')
-    ),
-        xaxis_title=dict(
-            text='Number of Colonies',
-            font=dict(size=14, color='#595959')
-        ), yaxis_title=dict(
-            text='Total Production',
-            font=dict(size=14, color='#595959')
-        ),
-        plot_bgcolor='white',
-        showlegend=False,
-        xaxis=dict(
-            showline=True,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='#D9D9D9',
-            linewidth=2,
-            ticks='outside',
-            tickcolor='#595959',
-            tickfont=dict(
-                color='#595959'
-            )
-        ),
-        yaxis=dict(
-            showline=True,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='#D9D9D9',
-            linewidth=2,
-            tickfont=dict(
-                color='#595959'
-            )
-        ))
+def production_colonies_graph(state_input, years=None):
+    honey_cube = data_store.current().cube
 
-    return production_colonies_fig
+    return bubble_figure(honey_cube.states, honey_cube.totals_by_state('production', years),
+                         honey_cube.totals_by_state('colonies_number', years))
 
 
 # Temperature Anomalies Callback
-@app.callback(Output(component_id='temperature-anomalies', component_property='figure'),
-              Input(component_id='input-state', component_property='value'))
+@cached_figure(figure_cache, 'temperature_anomalies_graph', dataset_version, ignore_input=True, flight=single_flight)
 # Temperature Anomalies Graph Function
 def temperature_anomalies_graph(state_input):
-    temperature_anomalies_fig = go.Figure(data=go.Scatter(
-        x=temperature_data['Year'], y=temperature_data['Value'],
-        mode='markers',
-        marker=dict(
-            size=12,
-            color=temperature_data['Value'],
-            colorscale='RdBu',
-            reversescale=True,
-            showscale=True,
-            colorbar=dict(
-                tickvals=[-1.3, 1.99],
-                ticktext=['colder', 'warmer'],
-                ticks='outside'
-            )
-        )
-    ))
-
-    temperature_anomalies_fig.add_hline(y=0, line_color='#8C8C8C', line_width=1,
-                                        annotation_text="baseline",
-                                        annotation_position="bottom right",
-                                        annotation_font_size=14,
-                                        annotation_font_color="#8C8C8C")
-
-    temperature_anomalies_fig.update_layout(title=dict(
-        text='Temperature Anomalies From 1910 to 2022',
-        font=dict(size=20, color='#0C0B09')
-    ),
-        xaxis_title=dict(
-            text='Year',
-            font=dict(size=14, color='#595959')
-        ), yaxis_title=dict(
-            text='Anomalies Values',
-            font=dict(size=14, color='#595959')
-        ),
-        plot_bgcolor='white',
-        showlegend=False,
-        xaxis=dict(
-            showline=True,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='#D9D9D9',
-            linewidth=2,
-            ticks='outside',
-            tickcolor='#595959',
-            tickfont=dict(
-                color='#595959'
-            )
-        ),
-        yaxis=dict(
-            showline=True,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='#D9D9D9',
-            linewidth=2,
-            tickfont=dict(
-                color='#595959'
-            )
-        ),
-        coloraxis_colorbar=dict(
-            title='anomalies'
-        ))
+    temperature_data = data_store.current().temperature_data
+    analytics = data_store.current().analytics
+
+    # With the rolling mean of the anomalies and the national production of the honey years
+    return temperature_figure(temperature_data['Year'].to_numpy(), temperature_data['Value'].to_numpy(),
+                              rolling=analytics.rolling_anomalies,
+                              production=(data_store.current().cube.years, analytics.production[0]))
+
 
-    return temperature_anomalies_fig
+# All the outputs driven by the states dropdown are returned by a single callback,
+# so a dropdown change is one request that resolves the selection once.
+# In the clientside mode the overview cards and line charts are left to the browser,
+# in the background mode the line charts to a background callback.
+overview_outputs = [
+    Output(component_id='total-production', component_property='children'),
+    Output(component_id='total-colonies', component_property='children'),
+    Output(component_id='total-stock', component_property='children'),
+    Output(component_id='total-value-production', component_property='children')
+]
+trend_outputs = [
+    Output(component_id='production-change', component_property='children'),
+    Output(component_id='yield-per-colony', component_property='children'),
+    Output(component_id='price-trend', component_property='children'),
+    Output(component_id='colonies-correlation', component_property='children')
+]
+line_outputs = [
+    Output(component_id='production-overtime', component_property='figure'),
+    Output(component_id='colonies-number', component_property='figure')
+]
+chart_outputs = [
+    Output(component_id='production-on-map', component_property='figure'),
+    Output(component_id='top-production', component_property='figure')
+]
+# Outputs that do not depend on the state
+range_outputs = [
+    Output(component_id='production-colonies', component_property='figure')
+]
+static_outputs = [
+    Output(component_id='temperature-anomalies', component_property='figure')
+]
+
+
+# Id given by Dash to the callback of several outputs, the 'output' of its requests
+def callback_id(outputs):
+    return '..{}..'.format('...'.join('{}.{}'.format(output.component_id, output.component_property)
+                                      for output in outputs))
+
+
+# Outputs of the dispatch callback
+dashboard_outputs = ((overview_outputs if not CLIENTSIDE else [])
+                     + (line_outputs if not CLIENTSIDE and not BACKGROUND else [])
+                     + trend_outputs + chart_outputs + range_outputs + static_outputs)
+ranking_output = [i for i, output in enumerate(dashboard_outputs) if output.component_id == 'top-production'][0]
+# Year slider of the dispatch callback
+YEAR_CONTROL = 'year-range'
+
+
+# Values of the dashboard outputs for a dropdown value
+# ranking holds the metric, size and order of the ranking chart, years the resolved year range
+# The figures that do not depend on the state are only built when include_range
+# (year range dependent) and include_static are set
+def dashboard(state_input, ranking=tuple(RANKING_CONTROLS.values()), years=None, include_range=True,
+              include_static=True):
+    selection = resolve_selection(state_input)
+    values = []
+    if not CLIENTSIDE:
+        values += overview(selection, years)
+    if not CLIENTSIDE and not BACKGROUND:
+        values += [production_overtime_graph(selection, years), colonies_number_graph(selection, years)]
+    values += trends(selection, years)
+    values += [production_map(selection, years), top_production_graph(selection, *ranking, years)]
+    values += [production_colonies_graph(selection, years) if include_range else dash.no_update]
+    values += [temperature_anomalies_graph(selection) if include_static else dash.no_update]
+    return values
+
+
+# Dispatch callback of the states dropdown, the ranking controls and the year range
+def update_dashboard(state_input, *controls):
+    ranking = resolve_ranking(*controls[:-1])
+    years = resolve_years(controls[-1])
+    triggered = dash.ctx.triggered_id
+    # A change of the ranking controls only updates the ranking chart
+    if triggered in RANKING_CONTROLS:
+        values = [dash.no_update] * len(dashboard_outputs)
+        values[ranking_output] = top_production_graph(resolve_selection(state_input), *ranking, years)
+        return values
+    # The static figures are sent with the first call of a page only, the ones that
+    # only depend on the year range when it changes
+    return dashboard(state_input, ranking, years, include_range=triggered in (None, YEAR_CONTROL),
+                     include_static=triggered is None)
+
+
+# Background callback of the line charts, run in a job process
+# set_progress reports the number of charts built so far to the progress bar
+def update_comparisons(set_progress, state_input, year_range):
+    selection = resolve_selection(state_input)
+    years = resolve_years(year_range)
+    figures = []
+    for graph in [production_overtime_graph, colonies_number_graph]:
+        figures.append(graph(selection, years))
+        set_progress(str(len(figures)))
+    return figures
+
+
+# Settings of create_app(), read from the environment
+# data_loading is 'eager' (read the data in create_app), 'background' (in a warm-up
+# thread, the first requests wait for it) or 'lazy' (on the first request)
+def default_config():
+    return {
+        'data_loading': os.environ.get('HONEY_DATA_LOADING', 'background'),
+        'data_backend': os.environ.get('HONEY_DATA_BACKEND', 'pandas'),
+        'reload_interval': float(os.environ.get('HONEY_RELOAD_INTERVAL', 30)),
+        'cache_check_interval': float(os.environ.get('HONEY_CACHE_CHECK_INTERVAL', 2)),
+        'cache_hash': os.environ.get('HONEY_CACHE_HASH') == '1',
+        'compress': os.environ.get('HONEY_COMPRESS', '1') == '1',
+        'compress_min_size': int(os.environ.get('HONEY_COMPRESS_MIN_SIZE', 500)),
+        'response_cache_size': int(os.environ.get('HONEY_RESPONSE_CACHE_SIZE', 256)),
+        'prerendered': os.environ.get('HONEY_PRERENDERED'),
+        'request_log': os.environ.get('HONEY_REQUEST_LOG') == '1',
+        'profile_every': int(os.environ.get('HONEY_PROFILE_EVERY', 0)),
+        'profile_dir': os.environ.get('HONEY_PROFILE_DIR'),
+        'figure_cache_warmup': os.environ.get('HONEY_FIGURE_CACHE_WARMUP') == '1',
+        'background_cache_dir': os.environ.get('HONEY_BACKGROUND_CACHE_DIR'),
+        'background_expire': int(os.environ.get('HONEY_BACKGROUND_EXPIRE', background.DEFAULT_EXPIRE)),
+    }
+
+
+# Load the data, build the first layout and optionally every figure for every state,
+# then log the time of every startup phase
+def warm_up_app(config):
+    data_store.load()
+    with startup_phase('layout'):
+        serve_layout()
+    if config['figure_cache_warmup']:
+        with startup_phase('figures'):
+            warm_up([production_overtime_graph, colonies_number_graph, production_map, top_production_graph,
+                     production_colonies_graph, temperature_anomalies_graph], data_store.current().states)
+    logger.info('Startup: %s', ', '.join('{} {:.3f}s'.format(phase_name, seconds)
+                                         for phase_name, seconds in startup_report().items()))
+
+
+def start_warm_up(config):
+    def run():
+        try:
+            warm_up_app(config)
+        except Exception:
+            logger.exception('Warm-up failed, the data is loaded by the first request')
+
+    threading.Thread(target=run, name='honey-warm-up', daemon=True).start()
+
+
+# Pick up new rows of the data files in the background, without restarting the workers
+def start_data_watcher(config):
+    global data_watcher
+    data_watcher = DataWatcher(data_store, interval=config['reload_interval'],
+                               on_swap=lambda snapshot: figure_cache.clear())
+    if data_watcher.interval > 0:
+        data_watcher.start()
+
+
+def stop_data_watcher():
+    if data_watcher.is_alive():
+        data_watcher.stop()
+
+
+# Threads do not survive a fork: with gunicorn --preload the workers are forked from
+# the process that created the app, so they start their own watcher, and their own
+# warm-up when the data was not loaded yet. The loaded snapshot is shared with the
+# parent copy-on-write. Called by the post_fork hook of gunicorn.conf.py only, the
+# other processes forked from a worker (background callbacks, process pools) serve
+# no request and keep no watcher.
+def after_fork(config):
+    start_data_watcher(config)
+    if config['data_loading'] == 'background' and not data_store.loaded():
+        start_warm_up(config)
+
+
+# Configs of the apps created so far, the forked workers restart the threads of the last one
+APP_CONFIGS = []
+
+
+# Create the Dash app (the module holds one: the callbacks read the data store of the last one created)
+def create_app(config=None):
+    global app, server, request_instrumentation, data_store, cache_invalidator, response_compression, prerendered
+    config = dict(default_config(), **(config or {}))
+    eager = config['data_loading'] == 'eager'
+    start = time.perf_counter()
+
+    # The layout is only checked against the callbacks when it is built now
+    dash_app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
+                         suppress_callback_exceptions=not eager)
+    flask_server = dash_app.server
+
+    # Timing of every request, with an optional JSON log line per request and
+    # cProfile dumps of one request in HONEY_PROFILE_EVERY (see instrumentation.py)
+    request_instrumentation = RequestInstrumentation(flask_server, log_requests=config['request_log'],
+                                                     profile_every=config['profile_every'],
+                                                     profile_dir=config['profile_dir'])
+
+    # The columnar artefacts built by `python datastore.py build` are memory-mapped
+    # when they are up to date, otherwise the CSV files are parsed.
+    # The current snapshot holds the US honey data, the North America temperature anomalies,
+    # the list of all the states, the state x year x metric aggregates and the map table.
+    # With HONEY_DATA_BACKEND=sqlite the honey rows are aggregated by the SQLite file
+    # built by `python data_access.py build` instead of being loaded into every worker.
+    data_store = SnapshotStore(HONEY_FILE, TEMPERATURE_FILE, STATES_FILE,
+                               database=str(database_path(HONEY_FILE)) if config['data_backend'] == 'sqlite' else None,
+                               lazy=True)
+
+    # Drop the cached results when any of the data files changes on disk
+    cache_invalidator = CacheInvalidator(figure_cache, [HONEY_FILE, TEMPERATURE_FILE, STATES_FILE],
+                                         interval=config['cache_check_interval'], use_hash=config['cache_hash'])
+    cache_invalidator.add_listener(lambda fingerprint: data_watcher.wake())
+    flask_server.before_request(check_data_files)
+    flask_server.route('/metrics')(metrics_endpoint)
+
+    # Compressed responses, with ETags and a response cache for the callback requests
+    # (but the background callback, whose polls answer the progress of a job)
+    response_compression = None
+    if config['compress']:
+        response_compression = ResponseCompression(flask_server, dataset_version,
+                                                   routes_prefix=dash_app.config.routes_pathname_prefix,
+                                                   min_size=config['compress_min_size'],
+                                                   cache_size=config['response_cache_size'],
+                                                   uncached_outputs=[callback_id(line_outputs)] if BACKGROUND else ())
+
+    # Responses of every dropdown value rendered ahead of time by `python prerender.py build`,
+    # answered from memory while the data has the version they were rendered from
+    prerendered = None
+    if config['prerendered']:
+        prerendered = PrerenderedResponses(flask_server, config['prerendered'], dataset_version,
+                                           routes_prefix=dash_app.config.routes_pathname_prefix)
+
+    dash_app.callback(dashboard_outputs,
+                      Input(component_id='input-state', component_property='value'),
+                      [Input(component_id=control, component_property='value') for control in RANKING_CONTROLS],
+                      Input(component_id=YEAR_CONTROL, component_property='value'))(update_dashboard)
+    if BACKGROUND:
+        # The results are cached on the inputs and the dataset version, a running job
+        # is terminated by Dash when the dropdown or the year range changes again
+        manager = background.create_manager(config['background_cache_dir'], cache_by=[dataset_version],
+                                            expire=config['background_expire'])
+        dash_app.callback(line_outputs,
+                          Input(component_id='input-state', component_property='value'),
+                          Input(component_id=YEAR_CONTROL, component_property='value'),
+                          background=True, manager=manager, interval=500,
+                          progress=Output(component_id='comparison-progress', component_property='value'),
+                          progress_default='0',
+                          running=[(Output(component_id='comparison-progress', component_property='style'),
+                                    {'width': '100%', 'visibility': 'visible'},
+                                    {'width': '100%', 'visibility': 'hidden'})])(update_comparisons)
+    elif os.environ.get('HONEY_BACKGROUND_CALLBACKS') == '1' and not CLIENTSIDE:
+        logger.warning('diskcache is not installed, the line charts are computed by the dispatch callback')
+    if CLIENTSIDE:
+        for function_name, outputs in [('overview', overview_outputs), ('production_overtime', line_outputs[0]),
+                                       ('colonies_number', line_outputs[1])]:
+            dash_app.clientside_callback(ClientsideFunction(namespace='honey', function_name=function_name),
+                                         outputs,
+                                         Input(component_id='input-state', component_property='value'),
+                                         Input(component_id=YEAR_CONTROL, component_property='value'),
+                                         State(component_id='state-series', component_property='data'))
+    metrics.record_startup('app', time.perf_counter() - start)
+
+    app, server = dash_app, flask_server
+    if eager:
+        warm_up_app(config)
+        # Serve the layout (evaluated now by Dash, with the data loaded)
+        dash_app.layout = serve_layout
+        # Keep the collector from writing to the objects built so far, so the
+        # processes forked from this one keep sharing their memory pages
+        gc.freeze()
+    else:
+        dash_app.layout = serve_layout
+        if config['data_loading'] == 'background':
+            start_warm_up(config)
+    start_data_watcher(config)
+    if not APP_CONFIGS:
+        # Every forked process reads the store (the background callback jobs too),
+        # none of them may inherit a lock held by a thread of the parent
+        os.register_at_fork(after_in_child=lambda: data_store.after_fork())
+    APP_CONFIGS.append(config)
+    return dash_app
+
+
+# Names created by create_app(), which importing the module does not call
+APP_ATTRIBUTES = {'app', 'server', 'request_instrumentation', 'data_store', 'cache_invalidator',
+                  'response_compression', 'prerendered', 'data_watcher'}
+
+
+# Create the app with the default config on the first access to one of them (gunicorn app:server)
+def __getattr__(name):
+    if name in APP_ATTRIBUTES:
+        create_app()
+        return globals()[name]
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
 
 # Run the app
+# With --startup-report, print the time of the startup phases instead
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    if '--startup-report' in sys.argv[1:]:
+        create_app({'data_loading': 'eager', 'reload_interval': 0})
+        print(json.dumps(startup_report(), indent=2))
+    else:
+        create_app({'data_loading': 'eager'}).run_server(debug=True)
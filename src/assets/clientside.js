@@ -0,0 +1,169 @@
+// Clientside callbacks of the dashboard (HONEY_CLIENTSIDE=1)
+// They rebuild the overview cards and the line charts from the series stored in
+// the 'state-series' dcc.Store, mirroring overview() and line_plots() in app.py,
+// over the year range of the slider.
+(function () {
+    // Canonical selection: 'All' or a sorted list of known states (regions expanded)
+    function resolve(selection, payload) {
+        if (selection === null || selection === undefined || selection.length === 0) {
+            return 'All';
+        }
+        if (typeof selection === 'string') {
+            selection = [selection];
+        }
+        var names = {};
+        for (var i = 0; i < selection.length; i++) {
+            var value = selection[i];
+            // 'All' picked along with states is dropped
+            if (value === 'All') {
+                continue;
+            }
+            var members = [value];
+            if (value.indexOf(payload.region_prefix) === 0) {
+                members = payload.regions[value.slice(payload.region_prefix.length)] || [];
+            }
+            members.forEach(function (name) {
+                if (payload.totals.hasOwnProperty(name)) {
+                    names[name] = true;
+                }
+            });
+        }
+        var states = Object.keys(names).sort();
+        return states.length ? states : 'All';
+    }
+
+    // Canonical year range: null for all the years, otherwise [first, last] clipped to the data
+    function resolveYears(yearRange, payload) {
+        var firstYear = payload.years[0];
+        var lastYear = payload.years[payload.years.length - 1];
+        if (!yearRange || yearRange.length === 0) {
+            return null;
+        }
+        var first = Math.min(Math.max(Math.min.apply(null, yearRange), firstYear), lastYear);
+        var last = Math.max(Math.min(Math.max.apply(null, yearRange), lastYear), first);
+        if (first === firstYear && last === lastYear) {
+            return null;
+        }
+        return [first, last];
+    }
+
+    function inRange(year, years) {
+        return years === null || (year >= years[0] && year <= years[1]);
+    }
+
+    // Years and values of a metric summed over the selection (years without data are skipped)
+    function series(selection, metric, years, payload) {
+        var rangeYears = [];
+        var values = [];
+        payload.years.forEach(function (year, i) {
+            if (!inRange(year, years)) {
+                return;
+            }
+            var total = null;
+            if (selection === 'All') {
+                total = payload.national[metric][i];
+            } else {
+                selection.forEach(function (state) {
+                    var value = payload.series[metric][state][i];
+                    if (value !== null) {
+                        total = (total || 0) + value;
+                    }
+                });
+            }
+            if (total !== null) {
+                rangeYears.push(year);
+                values.push(total);
+            }
+        });
+        return {years: rangeYears, values: values};
+    }
+
+    // Same output as '{:,}M'.format(round(total / 1000000, 1)) in Python
+    function millions(total) {
+        return (Math.round(total / 100000) / 10).toLocaleString('en-US', {
+            minimumFractionDigits: 1, maximumFractionDigits: 1
+        }) + 'M';
+    }
+
+    function lineFigure(stateInput, yearRange, payload, metric) {
+        var selection = resolve(stateInput, payload);
+        var years = resolveYears(yearRange, payload);
+        var target = series(selection, metric, years, payload);
+        var data = [];
+
+        // Thin line for each of the compared states
+        if (selection !== 'All' && selection.length > 1) {
+            var positions = [];
+            payload.years.forEach(function (year, i) {
+                if (inRange(year, years)) {
+                    positions.push(i);
+                }
+            });
+            selection.forEach(function (state) {
+                data.push({type: 'scatter', name: state,
+                           x: positions.map(function (i) { return payload.years[i]; }),
+                           y: positions.map(function (i) { return payload.series[metric][state][i]; }),
+                           line: {color: '#B4BEC9', width: 1}, connectgaps: true});
+            });
+        }
+        data.push({type: 'scatter', x: target.years, y: target.values,
+                   line: {color: '#D9560B', width: 3}, connectgaps: true});
+        // The layouts are sent without their (shared) template
+        var layout = JSON.parse(JSON.stringify(Object.assign({template: payload.template},
+                                                             payload.layouts[metric])));
+        // No marker without data in the year range, no percentage change from 0
+        if (target.values.length === 0) {
+            return {data: data, layout: layout};
+        }
+
+        var firstValue = Math.trunc(target.values[0]);
+        var lastValue = Math.trunc(target.values[target.values.length - 1]);
+        var lastYear = target.years[target.years.length - 1];
+        data.push({type: 'scatter', x: [lastYear], y: [lastValue], mode: 'markers',
+                   marker: {color: '#D9560B', size: 10}});
+        if (firstValue !== 0) {
+            layout.annotations = [{
+                x: lastYear + 2,
+                y: lastValue,
+                text: (Math.round(((lastValue - firstValue) / firstValue) * 1000) / 10).toFixed(1) + '%',
+                showarrow: false,
+                font: {size: 14, color: '#D9560B'}
+            }];
+        }
+        return {data: data, layout: layout};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        honey: {
+            overview: function (stateInput, yearRange, payload) {
+                var selection = resolve(stateInput, payload);
+                var years = resolveYears(yearRange, payload);
+                var states = selection === 'All' ? payload.states : selection;
+                var totals = [0, 0, 0, 0];
+                states.forEach(function (state) {
+                    if (years === null) {
+                        payload.totals[state].forEach(function (value, i) {
+                            totals[i] += value;
+                        });
+                        return;
+                    }
+                    // Sum of the yearly values within the range
+                    payload.overview_metrics.forEach(function (metric, m) {
+                        payload.series[metric][state].forEach(function (value, i) {
+                            if (value !== null && inRange(payload.years[i], years)) {
+                                totals[m] += value;
+                            }
+                        });
+                    });
+                });
+                return totals.map(millions);
+            },
+            production_overtime: function (stateInput, yearRange, payload) {
+                return lineFigure(stateInput, yearRange, payload, 'production');
+            },
+            colonies_number: function (stateInput, yearRange, payload) {
+                return lineFigure(stateInput, yearRange, payload, 'colonies_number');
+            }
+        }
+    });
+})();
@@ -0,0 +1,37 @@
+# Background callbacks for the heavy views
+# A background callback returns at once with a job id: the job runs in a separate
+# process started by Dash's DiskcacheManager and the page polls for its progress and
+# result, so a request worker is not held for the whole computation. The results are
+# kept in a local diskcache directory keyed on the callback inputs and the dataset
+# version, so a repeated selection is answered without starting a job. Dash
+# terminates the running job of a callback when it is triggered again (a new
+# dropdown value while a comparison is computed).
+# The manager needs the diskcache extras of Dash: pip install "dash[diskcache]"
+import os
+import tempfile
+
+try:
+    import diskcache
+    import multiprocess  # noqa: F401
+    import psutil  # noqa: F401
+except ImportError:
+    diskcache = None
+
+# Seconds a cached result is kept after its last read
+DEFAULT_EXPIRE = 3600
+
+
+# Whether the dependencies of the background callbacks are installed
+def available():
+    return diskcache is not None
+
+
+# Manager of the background callbacks, None when diskcache is not installed
+# cache_by is a list of functions whose results are part of the cache keys
+def create_manager(cache_dir=None, cache_by=None, expire=DEFAULT_EXPIRE):
+    if not available():
+        return None
+    from dash import DiskcacheManager
+
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'honey_background')
+    return DiskcacheManager(diskcache.Cache(cache_dir), cache_by=cache_by, expire=expire)
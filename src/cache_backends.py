@@ -0,0 +1,252 @@
+# Cache backends shared by the callbacks
+# Every backend stores str payloads under tuple keys with get/put/clear/stats,
+# like the in-process FigureCache, so they can be swapped through HONEY_CACHE_BACKEND:
+#   memory - per-worker LRU dictionary (default)
+#   disk   - SQLite file shared by all the workers of the machine
+#   shm    - one multiprocessing.shared_memory segment per entry
+# All of them are bounded by max_size (HONEY_CACHE_SIZE) entries.
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from figure_cache import FigureCache
+
+
+# Stable text form of a cache key
+def key_to_str(key):
+    return '|'.join(map(str, key))
+
+
+# Short hash of a cache key, usable in file and segment names
+def key_digest(key):
+    return hashlib.sha1(key_to_str(key).encode()).hexdigest()
+
+
+class DiskBackend:
+    def __init__(self, path, max_size=4096):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        connection = self._connection()
+        # Files of the first layout (entries dated by their creation) are dropped, they only hold a cache
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(cache)')]
+        if columns and 'last_used' not in columns:
+            connection.execute('DROP TABLE cache')
+        connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, payload TEXT, last_used REAL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)')
+
+    # One connection per thread, SQLite handles the locking between processes
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # A connection opened before a fork is not used by the child (gunicorn --preload)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute('SELECT payload FROM cache WHERE key = ?', (key_to_str(key),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Mark the entry as most recently used
+        connection.execute('UPDATE cache SET last_used = ? WHERE key = ?', (time.time(), key_to_str(key)))
+        return row[0]
+
+    def put(self, key, payload):
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                           (key_to_str(key), payload, time.time()))
+        # Evict the least recently used entries once the table is over its bound
+        connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used DESC '
+                           'LIMIT -1 OFFSET ?)', (self.max_size,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def stats(self):
+        size = self._connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        return {'size': size, 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+class SharedMemoryBackend:
+    # Segment layout: 8 bytes payload length followed by the utf-8 payload
+    HEADER = 8
+    # Directory of the POSIX shared memory segments on Linux
+    SHM_DIR = '/dev/shm'
+
+    def __init__(self, prefix='honey', max_size=512):
+        self.prefix = prefix
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Segments created by this worker, in creation order
+        self._names = {}
+
+    def _segment_name(self, key):
+        return '{}_{}'.format(self.prefix, key_digest(key)[:20])
+
+    # Segments of this prefix made by all the workers, least recently used first.
+    # Without /dev/shm only the segments of this worker are known.
+    def _segments(self):
+        if not os.path.isdir(self.SHM_DIR):
+            return list(self._names)
+        segments = []
+        for name in os.listdir(self.SHM_DIR):
+            if name.startswith(self.prefix + '_'):
+                try:
+                    segments.append((os.stat(os.path.join(self.SHM_DIR, name)).st_mtime_ns, name))
+                except FileNotFoundError:
+                    continue
+        return [name for _, name in sorted(segments)]
+
+    # Mark a segment as recently used, its mtime orders the eviction
+    def _touch(self, name):
+        try:
+            os.utime(os.path.join(self.SHM_DIR, name))
+        except OSError:
+            pass
+
+    # Segments outlive the worker that created them, so keep them away from the
+    # resource tracker which would otherwise unlink them when that worker exits
+    @staticmethod
+    def _untrack(segment):
+        try:
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        except Exception:
+            pass
+
+    @staticmethod
+    def _unlink(name):
+        try:
+            segment = shared_memory.SharedMemory(name=name.lstrip('/'))
+        except FileNotFoundError:
+            return
+        # unlink() also releases the tracker registration made when attaching
+        segment.close()
+        segment.unlink()
+
+    def get(self, key):
+        try:
+            segment = shared_memory.SharedMemory(name=self._segment_name(key))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self._untrack(segment)
+        try:
+            length = int.from_bytes(segment.buf[:self.HEADER], 'little')
+            # A zero length means the writer has not finished yet
+            payload = bytes(segment.buf[self.HEADER:self.HEADER + length]).decode() if length else None
+        finally:
+            segment.close()
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._touch(self._segment_name(key))
+        return payload
+
+    def put(self, key, payload):
+        data = payload.encode()
+        try:
+            segment = shared_memory.SharedMemory(name=self._segment_name(key), create=True,
+                                                 size=self.HEADER + len(data))
+        except FileExistsError:
+            # Another worker already stored this entry
+            return
+        self._untrack(segment)
+        # Write the payload before its length so readers never see a partial entry
+        segment.buf[self.HEADER:self.HEADER + len(data)] = data
+        segment.buf[:self.HEADER] = len(data).to_bytes(self.HEADER, 'little')
+        segment.close()
+        self._names[segment.name.lstrip('/')] = None
+        self._evict()
+
+    # Unlink the least recently used segments once the prefix is over its bound
+    def _evict(self):
+        segments = self._segments()
+        for name in segments[:max(len(segments) - self.max_size, 0)]:
+            self._unlink(name)
+            self._names.pop(name, None)
+
+    def clear(self):
+        # Unlink every segment of this prefix, including the ones made by other workers
+        for name in set(self._names) | set(self._segments()):
+            self._unlink(name)
+        self._names.clear()
+
+    def stats(self):
+        return {'size': len(self._segments()), 'max_size': self.max_size, 'hits': self.hits,
+                'misses': self.misses}
+
+
+# Build the backend selected by the environment
+def create_backend(kind=None, max_size=None):
+    kind = kind or os.environ.get('HONEY_CACHE_BACKEND', 'memory')
+    max_size = max_size or int(os.environ.get('HONEY_CACHE_SIZE', 512))
+    if kind == 'memory':
+        return FigureCache(max_size=max_size)
+    if kind == 'disk':
+        cache_dir = os.environ.get('HONEY_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'us_honey_cache'))
+        os.makedirs(cache_dir, exist_ok=True)
+        return DiskBackend(os.path.join(cache_dir, 'callbacks.sqlite'), max_size=max_size)
+    if kind == 'shm':
+        return SharedMemoryBackend(prefix=os.environ.get('HONEY_CACHE_PREFIX', 'honey'), max_size=max_size)
+    raise ValueError('Unknown cache backend: {}'.format(kind))
+
+
+# Fingerprint of the data files from their mtime and size, or their content
+def data_fingerprint(paths, use_hash=False):
+    digest = hashlib.sha1()
+    for path in paths:
+        if use_hash:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        else:
+            stat = os.stat(path)
+            digest.update('{}:{}:{}'.format(path, stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()[:12]
+
+
+class CacheInvalidator:
+    # Clears the backend and notifies listeners when the data files change
+    def __init__(self, backend, paths, interval=2.0, use_hash=False):
+        self.backend = backend
+        self.paths = list(paths)
+        self.interval = interval
+        self.use_hash = use_hash
+        self.listeners = []
+        self.fingerprint = data_fingerprint(self.paths, use_hash)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # Cheap enough to call on every request, the files are looked at once per interval
+    def check(self):
+        now = time.monotonic()
+        if now - self._checked < self.interval:
+            return False
+        with self._lock:
+            if now - self._checked < self.interval:
+                return False
+            self._checked = now
+            fingerprint = data_fingerprint(self.paths, self.use_hash)
+            if fingerprint == self.fingerprint:
+                return False
+            self.fingerprint = fingerprint
+        self.backend.clear()
+        for listener in self.listeners:
+            listener(fingerprint)
+        return True
@@ -0,0 +1,61 @@
+# Data shipped to the browser for the clientside mode (HONEY_CLIENTSIDE=1)
+# The per-state series behind the overview cards and the line charts are sent once
+# in a dcc.Store, and assets/clientside.js rebuilds those outputs on dropdown changes.
+from regions import REGIONS, REGION_PREFIX
+
+# Metrics of the line charts and of the overview cards
+LINE_METRICS = ['production', 'colonies_number']
+OVERVIEW_METRICS = ['production', 'colonies_number', 'stocks', 'value_of_production']
+# Layout keys of the Plotly template that apply to the line charts (the others are for
+# polar, 3D, geo or colour-scaled traces)
+TEMPLATE_LAYOUT_KEYS = ['autotypenumbers', 'colorway', 'font', 'hoverlabel', 'hovermode', 'paper_bgcolor',
+                        'plot_bgcolor', 'title', 'xaxis', 'yaxis']
+
+
+# Number without a trailing '.0' in the JSON when it is whole
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+# Series of a row of the cube, None where there is no data
+def _series(values, present):
+    return [_number(value) if is_present else None for value, is_present in zip(values, present)]
+
+
+# Parts of a Plotly template used by the scatter traces of the line charts
+def line_template(template):
+    return {'data': {'scatter': template.get('data', {}).get('scatter', [])},
+            'layout': {key: value for key, value in template.get('layout', {}).items()
+                       if key in TEMPLATE_LAYOUT_KEYS}}
+
+
+# JSON-serializable payload of the dcc.Store
+# line_layouts holds the layout of each line chart (without the annotation). Their
+# template is sent once, reduced to the parts the line charts use.
+def series_payload(cube, line_layouts):
+    templates = [layout.get('template', {}) for layout in line_layouts.values()]
+    line_layouts = {metric: {key: value for key, value in layout.items() if key != 'template'}
+                    for metric, layout in line_layouts.items()}
+    payload = {
+        'years': cube.years.tolist(),
+        'states': list(cube.states),
+        'regions': REGIONS,
+        'region_prefix': REGION_PREFIX,
+        'overview_metrics': OVERVIEW_METRICS,
+        'layouts': line_layouts,
+        'template': line_template(templates[0]) if templates else {},
+        'national': {},
+        'series': {},
+        'totals': {},
+    }
+    # Yearly series of the overview metrics too, for the totals of a year range
+    for metric in OVERVIEW_METRICS:
+        m = cube.metric_pos[metric]
+        payload['national'][metric] = _series(cube.national[:, m], cube.national_present)
+        payload['series'][metric] = {state: _series(cube.values[s, :, m], cube.present[s])
+                                     for s, state in enumerate(cube.states)}
+    for s, state in enumerate(cube.states):
+        payload['totals'][state] = [_number(cube.state_totals[s, cube.metric_pos[metric]])
+                                    for metric in OVERVIEW_METRICS]
+    return payload
@@ -0,0 +1,128 @@
+# Compression and conditional caching of the HTTP responses
+# Responses over a size threshold are compressed with brotli (when installed) or
+# gzip, and the compressed bytes are kept so identical responses (the static
+# figures, the 'All' map, the JS bundles) are compressed once.
+# The callback responses get a strong ETag from the dataset version, the query
+# string and the body of the request, tagged with the content encoding so the
+# gzip, br and identity bodies never share one: a matching If-None-Match is
+# answered with 304, and a repeated request is answered from the response cache
+# without running the callbacks. The requests of background callbacks are left
+# out: their responses (job handles, progress) change from one poll to the next.
+import gzip
+import hashlib
+import threading
+
+from flask import Response, request
+
+from figure_cache import FigureCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+UPDATE_PATH = '_dash-update-component'
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/')
+# Query arguments of the polls of the background callbacks
+BACKGROUND_ARGS = ('cacheKey', 'job', 'oldJob')
+
+
+def compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class ResponseCompression:
+    # version_func returns the dataset version the callback results depend on
+    # uncached_outputs holds the ids of the background callbacks (the 'output' of their requests)
+    def __init__(self, server, version_func, routes_prefix='/', min_size=500, level=6, cache_size=256,
+                 uncached_outputs=()):
+        self.version_func = version_func
+        self.uncached_outputs = set(uncached_outputs)
+        self.update_path = routes_prefix + UPDATE_PATH
+        self.min_size = min_size
+        self.level = level
+        # Compressed bodies by (body digest, encoding)
+        self.compressed = FigureCache(max_size=cache_size)
+        # Body and headers of the callback responses by ETag
+        self.responses = FigureCache(max_size=cache_size)
+        self.not_modified = 0
+        self._local = threading.local()
+        server.before_request(self.before_request)
+        server.after_request(self.after_request)
+
+    # Best encoding accepted by the client, None for identity
+    def _encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    # Whether the request starts or polls a background callback
+    def _background(self):
+        if any(arg in request.args for arg in BACKGROUND_ARGS):
+            return True
+        if not self.uncached_outputs:
+            return False
+        body = request.get_json(silent=True, cache=True)
+        return isinstance(body, dict) and body.get('output') in self.uncached_outputs
+
+    # ETag of a callback request for the negotiated encoding
+    def _etag(self, encoding):
+        digest = hashlib.sha1(self.version_func().encode())
+        digest.update(request.query_string)
+        # The body is kept by Flask so Dash can still read it
+        digest.update(request.get_data(cache=True))
+        return '{}-{}'.format(digest.hexdigest(), encoding or 'identity')
+
+    def before_request(self):
+        self._local.etag = None
+        self._local.cached = False
+        if request.method != 'POST' or request.path != self.update_path or self._background():
+            return None
+        etag = self._local.etag = self._etag(self._encoding())
+        if etag in request.if_none_match:
+            self.not_modified += 1
+            self._local.cached = True
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.vary.add('Accept-Encoding')
+            return response
+        cached = self.responses.get(etag)
+        if cached is not None:
+            self._local.cached = True
+            body, headers = cached
+            return Response(body, status=200, headers=headers)
+        return None
+
+    def after_request(self, response):
+        if getattr(self._local, 'cached', False):
+            return response
+        etag = getattr(self._local, 'etag', None)
+        if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+            return response
+        encoding = self._encoding()
+        body = response.get_data()
+        if encoding is not None and len(body) >= self.min_size:
+            key = (hashlib.sha1(body).hexdigest(), encoding)
+            compressed = self.compressed.get(key)
+            if compressed is None:
+                compressed = compress(body, encoding, self.level)
+                self.compressed.put(key, compressed)
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # Keep the callback response unless the data changed while it was computed
+        if etag is not None:
+            response.set_etag(etag)
+            if self._etag(encoding) == etag:
+                self.responses.put(etag, (response.get_data(), list(response.headers)))
+        return response
+
+    def stats(self):
+        return {'compressed': self.compressed.stats(), 'responses': self.responses.stats(),
+                'not_modified': self.not_modified}
@@ -0,0 +1,121 @@
+# SQLite store of the honey rows for datasets larger than the memory of a worker
+# The file keeps the rows indexed on (state, year) and their sums per (state, year).
+# The snapshot store builds the cube from those sums (cube_rows), so a worker only
+# holds one row per state and year instead of every row of the dataset, and the
+# cost of the load depends on the number of states and years, not of rows.
+#
+# Build the database of the honey CSV with: python data_access.py build
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from datastore import DATA_DIR, source_signature
+from schema import HONEY_SCHEMA
+
+HONEY_CSV = DATA_DIR / 'US_honey_dataset_updated.csv'
+TABLE = 'honey'
+# Sums of the rows per state and year
+ROLLUP = 'honey_by_state_year'
+# Columns that can be aggregated (the other columns are the state and the year)
+METRICS = [column for column in HONEY_SCHEMA.columns if column not in ('state', 'year')]
+CHUNK_ROWS = 200000
+
+
+# SQLite file built from a CSV file
+def database_path(csv_path):
+    return pathlib.Path(csv_path).with_suffix('.sqlite')
+
+
+def _check_metrics(metrics):
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError('Unknown metric {!r}'.format(metric))
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = str(path)
+        # sqlite3 connections are not shared between threads
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # Nor between a process and the processes forked from it
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect('file:{}?mode=ro'.format(pathlib.Path(self.path).resolve()), uri=True)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _query(self, sql, parameters=()):
+        return self._connection().execute(sql, parameters).fetchall()
+
+    # Sums of the metrics per state and year, sorted by state then year
+    def cube_rows(self, metrics=METRICS):
+        _check_metrics(metrics)
+        rows = pd.read_sql_query('SELECT state, year, {} FROM {} ORDER BY state, year'.format(
+            ', '.join(metrics), ROLLUP), self._connection())
+        rows['state'] = rows['state'].astype('category')
+        return rows
+
+    # Manifest stored with the rows: signature of the source CSV and of its schema
+    def manifest(self):
+        return json.loads(self._query('SELECT value FROM manifest')[0][0])
+
+
+# Whether the database of a CSV exists and was built from its current content and schema
+def is_fresh(csv_path, path=None):
+    path = pathlib.Path(path or database_path(csv_path))
+    if not path.exists():
+        return False
+    try:
+        manifest = SQLiteBackend(path).manifest()
+    except (sqlite3.Error, IndexError):
+        return False
+    return manifest['source'] == source_signature(csv_path) and manifest.get('schema') == HONEY_SCHEMA.signature()
+
+
+# Load the honey CSV into a SQLite file, a chunk of rows at a time
+def build_database(csv_path=HONEY_CSV, path=None):
+    path = pathlib.Path(path or database_path(csv_path))
+    # Write into a temporary file and swap it in so readers never see half a database
+    staging = path.with_name(path.name + '.tmp')
+    staging.unlink(missing_ok=True)
+    signature = source_signature(csv_path)
+    columns = ', '.join('{} {}'.format(column, 'TEXT' if column == 'state' else
+                                       'REAL' if np.dtype(dtype).kind == 'f' else 'INTEGER')
+                        for column, dtype in HONEY_SCHEMA.columns.items())
+    connection = sqlite3.connect(staging)
+    try:
+        connection.execute('CREATE TABLE {} ({})'.format(TABLE, columns))
+        rows = 0
+        for chunk in pd.read_csv(csv_path, chunksize=CHUNK_ROWS):
+            chunk = chunk[list(HONEY_SCHEMA.columns)]
+            chunk = chunk.astype({'state': str})
+            chunk.to_sql(TABLE, connection, if_exists='append', index=False)
+            rows += len(chunk)
+        connection.execute('CREATE INDEX {0}_state_year ON {0} (state, year)'.format(TABLE))
+        connection.execute('CREATE TABLE {} (state TEXT, year INTEGER, rows INTEGER, {}, PRIMARY KEY (state, year)) '
+                           'WITHOUT ROWID'.format(ROLLUP, ', '.join(METRICS)))
+        connection.execute('INSERT INTO {} SELECT state, year, COUNT(*), {} FROM {} GROUP BY state, year'.format(
+            ROLLUP, ', '.join('SUM({})'.format(metric) for metric in METRICS), TABLE))
+        connection.execute('CREATE TABLE manifest (value TEXT)')
+        connection.execute('INSERT INTO manifest VALUES (?)', [json.dumps(
+            {'source': signature, 'schema': HONEY_SCHEMA.signature(), 'rows': rows})])
+        connection.commit()
+    finally:
+        connection.close()
+    staging.replace(path)
+    return path
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['build']:
+        print('Usage: python data_access.py build')
+        sys.exit(1)
+    print('Built {}'.format(build_database()))
@@ -0,0 +1,224 @@
+# Versioned snapshots of the data read by the callbacks
+# A snapshot bundles the data frames with everything derived from them and is
+# never modified once built. A refresh builds the next snapshot on the side and
+# swaps the reference, so in-flight callbacks keep reading the one they started with.
+import hashlib
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from aggregates import HoneyCube
+from analytics import Analytics
+from datastore import load_table, read_table
+from instrumentation import startup_phase
+from kpis import KpiTable
+from rankings import RankingIndex
+from schema import HONEY_SCHEMA, TEMPERATURE_SCHEMA
+from state_index import MapTable, StateIndex
+
+logger = logging.getLogger(__name__)
+
+
+class DataSnapshot:
+    def __init__(self, generation, honey_data, temperature_data, cube, state_index):
+        self.generation = generation
+        self.honey_data = honey_data
+        self.temperature_data = temperature_data
+        self.cube = cube
+        self.state_index = state_index
+        # Production totals merged with the state codes for the map
+        self.map_table = MapTable(cube, state_index)
+        # Formatted KPIs of 'All' and of every state for the overview section
+        self.kpis = KpiTable(cube)
+        # Presorted rankings of the states by metric and year range
+        self.rankings = RankingIndex(cube)
+        # Correlations and national facts of the insights
+        self.analytics = Analytics(cube, temperature_data)
+        # List of all the states
+        self.states = ['All'] + list(cube.states)
+
+        # Dataset version, derived from the content so identical data shares cache entries
+        digest = hashlib.sha1(cube.version.encode())
+        digest.update(temperature_data.to_numpy(dtype=np.float64).tobytes())
+        digest.update('|'.join(map(str, state_index.codes)).encode())
+        self.version = digest.hexdigest()[:12]
+
+
+# Size and modification time of a file
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SnapshotStore:
+    # With a database (see data_access.py) the honey rows are aggregated per state
+    # and year by SQLite, so only the aggregates are held in memory
+    # A lazy store reads the data files on the first call of current() (or load())
+    def __init__(self, honey_file, temperature_file, states_file, database=None, lazy=False):
+        self.honey_file = honey_file
+        self.database = database
+        self.temperature_file = temperature_file
+        self.states_file = states_file
+        self._current = None
+        self._signatures = {}
+        self.after_fork()
+        if not lazy:
+            self.load()
+
+    # Locks of a forked process: a lock held by a thread of the parent during the
+    # fork would never be released in the child
+    def after_fork(self):
+        # Serializes the refreshes, the callbacks never take it
+        self._lock = threading.Lock()
+        # Serializes the first load, the callbacks wait on it until the data is loaded
+        self._load_lock = threading.Lock()
+
+    # The snapshot the callbacks should read
+    def current(self):
+        snapshot = self._current
+        if snapshot is None:
+            return self.load()
+        return snapshot
+
+    # Whether the first snapshot is built
+    def loaded(self):
+        return self._current is not None
+
+    # Build the first snapshot if it is not built yet, and return the current one
+    def load(self):
+        with self._load_lock:
+            if self._current is None:
+                with startup_phase('data_load'):
+                    # Signatures are taken before reading, so a write during a load is picked up next time
+                    signatures = self._file_signatures()
+                    honey_data = self._load_honey()
+                    temperature_data = self._load_temperature()
+                    state_index = self._load_states()
+                with startup_phase('aggregates'):
+                    snapshot = DataSnapshot(1, honey_data, temperature_data, HoneyCube(honey_data), state_index)
+                self._signatures = signatures
+                self._current = snapshot
+                logger.info('Data snapshot 1 (version %s) loaded', snapshot.version)
+        return self._current
+
+    def _file_signatures(self):
+        paths = [self.honey_file, self.temperature_file, self.states_file]
+        # A rebuilt database is picked up like a changed data file
+        if self.database is not None and os.path.exists(self.database):
+            paths.append(self.database)
+        return {path: file_signature(path) for path in paths}
+
+    def _load_honey(self):
+        if self.database is not None and data_access.is_fresh(self.honey_file, self.database):
+            backend = data_access.SQLiteBackend(self.database)
+            honey_data, self._honey_size = backend.cube_rows(), backend.manifest()['source']['size']
+        else:
+            if self.database is not None:
+                logger.warning('%s is missing or older than %s, reading the CSV', self.database, self.honey_file)
+            honey_data, self._honey_size = load_table(self.honey_file, HONEY_SCHEMA)
+        with open(self.honey_file, 'rb') as f:
+            self._honey_header = f.readline()
+        return honey_data
+
+    def _load_temperature(self):
+        return read_table(self.temperature_file, TEMPERATURE_SCHEMA)
+
+    def _load_states(self):
+        return StateIndex(self.states_file)
+
+    # Rows appended to the honey CSV since it was last read
+    # Returns None when the file was rewritten rather than appended to
+    def _appended_honey_rows(self):
+        with open(self.honey_file, 'rb') as f:
+            if f.readline() != self._honey_header:
+                return None
+            if os.fstat(f.fileno()).st_size <= self._honey_size:
+                return None
+            f.seek(self._honey_size - 1)
+            if f.read(1) != b'\n':
+                return None
+            tail = f.read()
+        # A partially written last line is left for the next refresh
+        tail = tail[:tail.rfind(b'\n') + 1]
+        self._honey_size += len(tail)
+        return HONEY_SCHEMA.apply(pd.read_csv(io.BytesIO(self._honey_header + tail)))
+
+    # Build and swap in a new snapshot if any data file changed, True when swapped
+    def refresh(self):
+        with self._lock:
+            # Nothing to refresh before the first load, which reads the current files
+            if self._current is None:
+                return False
+            signatures = self._file_signatures()
+            changed = {path for path, signature in signatures.items() if self._signatures.get(path) != signature}
+            if not changed:
+                return False
+            old = self._current
+            honey_size, honey_header = self._honey_size, self._honey_header
+            try:
+                self._current = self._next_snapshot(old, changed)
+            except Exception:
+                # Read again from the same place on the next refresh
+                self._honey_size, self._honey_header = honey_size, honey_header
+                raise
+            self._signatures = signatures
+            logger.info('Data snapshot %s (version %s) swapped in', self._current.generation, self._current.version)
+            return True
+
+    def _next_snapshot(self, old, changed):
+        honey_data, cube = old.honey_data, old.cube
+        temperature_data, state_index = old.temperature_data, old.state_index
+
+        if self.honey_file in changed or self.database in changed:
+            # The database is rebuilt from the whole CSV, so appended rows are not folded in
+            new_rows = self._appended_honey_rows() if self.database is None else None
+            if new_rows is None:
+                honey_data = self._load_honey()
+                cube = HoneyCube(honey_data)
+            elif len(new_rows):
+                # Only the appended rows are parsed and folded into the aggregates
+                honey_data = HONEY_SCHEMA.apply(pd.concat([honey_data, new_rows], ignore_index=True))
+                cube = cube.extended(new_rows)
+        if self.temperature_file in changed:
+            temperature_data = self._load_temperature()
+        if self.states_file in changed:
+            state_index = self._load_states()
+
+        return DataSnapshot(old.generation + 1, honey_data, temperature_data, cube, state_index)
+
+
+class DataWatcher(threading.Thread):
+    # Background thread polling the data files and refreshing the snapshot store
+    def __init__(self, store, interval=30.0, on_swap=None):
+        super().__init__(name='honey-data-watcher', daemon=True)
+        self.store = store
+        self.interval = interval
+        self.on_swap = on_swap
+        self._wake = threading.Event()
+        self._stopped = False
+
+    # Refresh now instead of at the end of the current interval
+    def wake(self):
+        self._wake.set()
+
+    # End the thread after the refresh in progress, if any
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                if self.store.refresh() and self.on_swap is not None:
+                    self.on_swap(self.store.current())
+            except Exception:
+                logger.exception('Data refresh failed, keeping the current snapshot')
@@ -0,0 +1,126 @@
+# Columnar binary store of the CSV data files
+# Each CSV is converted once into a directory with one .npy file per column in the
+# compact dtype of its schema plus a manifest. Loading memory-maps the columns, so the gunicorn
+# workers share the pages through the OS page cache instead of each parsing the CSV.
+#
+# Build the artefacts with: python datastore.py build
+import io
+import json
+import os
+import pathlib
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from schema import HONEY_SCHEMA, TEMPERATURE_SCHEMA
+
+DATA_DIR = pathlib.Path(__file__).resolve().parent / 'data'
+
+# Data files and their schemas, relative to the data directory
+DATASETS = {
+    'US_honey_dataset_updated.csv': HONEY_SCHEMA,
+    'North_America_Temperature_Anomalies.csv': TEMPERATURE_SCHEMA,
+}
+
+MANIFEST = 'manifest.json'
+
+
+# Directory holding the binary artefact of a CSV file
+def store_path(csv_path):
+    return pathlib.Path(csv_path).with_suffix('.store')
+
+
+# Size and modification time identifying the version of a CSV file
+def source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# Read a CSV and apply its schema
+def read_csv(csv_path, schema):
+    return schema.apply(pd.read_csv(csv_path))
+
+
+# Convert a CSV file into its columnar artefact
+def build_store(csv_path, schema):
+    data = read_csv(csv_path, schema)
+    target = store_path(csv_path)
+    # Write into a temporary directory and swap it in so readers never see half an artefact
+    staging = target.with_name(target.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    columns = []
+    for i, column in enumerate(data.columns):
+        entry = {'name': column, 'file': 'col{}.npy'.format(i)}
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry['categories'] = values.cat.categories.tolist()
+            values = values.cat.codes
+        np.save(staging / entry['file'], values.to_numpy())
+        columns.append(entry)
+
+    manifest = {'source': source_signature(csv_path), 'schema': schema.signature(), 'rows': len(data),
+                'columns': columns}
+    with open(staging / MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return target
+
+
+# Whether the artefact of a CSV exists and was built from its current content and schema
+def is_fresh(csv_path, schema):
+    manifest_path = store_path(csv_path) / MANIFEST
+    if not manifest_path.exists():
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest['source'] == source_signature(csv_path) and manifest.get('schema') == schema.signature()
+
+
+# Memory-map the columns of an artefact into a DataFrame without copying them
+def load_store(path):
+    path = pathlib.Path(path)
+    with open(path / MANIFEST) as f:
+        manifest = json.load(f)
+    columns = {}
+    for entry in manifest['columns']:
+        values = np.load(path / entry['file'], mmap_mode='r')
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, categories=entry['categories'])
+        columns[entry['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+# Load a data file from its artefact, falling back to the CSV when it is missing or stale
+def read_table(csv_path, schema):
+    return load_table(csv_path, schema)[0]
+
+
+# Same as read_table, also returning the size of the CSV the data was read from
+def load_table(csv_path, schema):
+    if is_fresh(csv_path, schema):
+        with open(store_path(csv_path) / MANIFEST) as f:
+            size = json.load(f)['source']['size']
+        return load_store(store_path(csv_path)), size
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    return schema.apply(pd.read_csv(io.BytesIO(content))), len(content)
+
+
+# Build the artefacts of every data file
+def build_all(data_dir=DATA_DIR):
+    for name, schema in DATASETS.items():
+        target = build_store(pathlib.Path(data_dir) / name, schema)
+        print('Built {}'.format(target))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['build']:
+        print('Usage: python datastore.py build')
+        sys.exit(1)
+    build_all()
@@ -0,0 +1,195 @@
+# Static export of the dashboard
+# Every dropdown value is rendered in a pool of processes (see prerender.py) and
+# the results are embedded in a single HTML page with a switcher, so the dashboard
+# can be served by any static file host. Every distinct output value is stored
+# once (the figures that do not depend on the state are shared by all the values)
+# and plotly.js is written next to the page once.
+# The ranking controls and the year slider are left out: the figures use their defaults.
+#
+# Export the site with: python export.py [--output DIR] [--workers N]
+import argparse
+import html as html_text
+import json
+import os
+import pathlib
+import re
+import time
+
+from plotly.offline import get_plotlyjs
+
+from prerender import STATE_INPUT, render_all
+from serialization import dumps
+
+DEFAULT_OUTPUT = pathlib.Path(__file__).resolve().parent / 'site'
+PLOTLY_JS = 'plotly.min.js'
+TITLE = 'United States Honey Production'
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+{stylesheets}
+<script src="{plotly_js}"></script>
+</head>
+<body>
+{body}
+<script id="dashboard-data" type="application/json">{data}</script>
+<script>
+(function () {{
+    var data = JSON.parse(document.getElementById('dashboard-data').textContent);
+    // Outputs of a dropdown value, every value is an index into data.values
+    function show(value) {{
+        data.states[value].forEach(function (index, i) {{
+            var output = data.outputs[i];
+            var element = document.getElementById(output.id);
+            var content = data.values[index];
+            if (output.property === 'figure') {{
+                Plotly.react(element, content.data, content.layout, {{responsive: true}});
+            }} else {{
+                element.textContent = content;
+            }}
+        }});
+    }}
+    var select = document.getElementById('{state_input}');
+    select.addEventListener('change', function () {{ show(select.value); }});
+    show(select.value);
+}})();
+</script>
+</body>
+</html>
+"""
+
+
+# CSS declarations of a style dict (the layout uses CSS property names)
+def _style(style):
+    return '; '.join('{}: {}'.format(re.sub('([A-Z])', r'-\1', key).lower(), value) for key, value in style.items())
+
+
+# Bootstrap classes of a dbc.Col
+def _column_classes(component):
+    classes = []
+    for breakpoint in ['width', 'xs', 'sm', 'md', 'lg', 'xl']:
+        value = getattr(component, breakpoint, None)
+        if value is None or (breakpoint == 'xs' and getattr(component, 'width', None) is not None):
+            continue
+        infix = '' if breakpoint in ('width', 'xs') else '-' + breakpoint
+        if isinstance(value, dict):
+            if value.get('size') is not None:
+                classes.append('col{}-{}'.format(infix, value['size']))
+            if value.get('offset') is not None:
+                classes.append('offset{}-{}'.format(infix, value['offset']))
+        else:
+            classes.append('col{}-{}'.format(infix, value))
+    return classes or ['col']
+
+
+# Static HTML of a Dash layout
+# html components keep their tag, dbc rows and columns become Bootstrap grid
+# classes, the graphs empty containers and the states dropdown a select; the
+# other controls and the stores are left out.
+def to_html(component, options):
+    if component is None:
+        return ''
+    if isinstance(component, (list, tuple)):
+        return ''.join(to_html(child, options) for child in component)
+    if not hasattr(component, '_namespace'):
+        return html_text.escape(str(component))
+
+    kind = type(component).__name__
+    component_id = getattr(component, 'id', None)
+    attributes = {}
+    if component_id is not None:
+        attributes['id'] = component_id
+    if getattr(component, 'style', None):
+        attributes['style'] = _style(component.style)
+    children = to_html(getattr(component, 'children', None), options)
+
+    if component._namespace == 'dash_html_components':
+        tag = kind.lower()
+    elif kind == 'Row':
+        tag = 'div'
+        classes = ['row']
+        if getattr(component, 'justify', None):
+            classes.append('justify-content-' + component.justify)
+        if getattr(component, 'align', None):
+            classes.append('align-items-' + component.align)
+        attributes['class'] = ' '.join(classes)
+    elif kind == 'Col':
+        tag = 'div'
+        attributes['class'] = ' '.join(_column_classes(component))
+    elif kind == 'Graph':
+        tag = 'div'
+    elif kind == 'Dropdown' and component_id == STATE_INPUT:
+        tag = 'select'
+        attributes['class'] = 'form-select'
+        children = ''.join('<option value="{0}">{0}</option>'.format(html_text.escape(value)) for value in options)
+    else:
+        return ''
+
+    if tag in ('br', 'hr'):
+        return '<{}{}>'.format(tag, _attributes(attributes))
+    return '<{0}{1}>{2}</{0}>'.format(tag, _attributes(attributes), children)
+
+
+def _attributes(attributes):
+    return ''.join(' {}="{}"'.format(name, html_text.escape(str(value))) for name, value in attributes.items())
+
+
+# Outputs of every dropdown value, with every distinct value stored once
+def page_data(rendered):
+    outputs = None
+    values = []
+    positions = {}
+    states = {}
+    for value, key, body in rendered:
+        response = json.loads(body)['response']
+        if outputs is None:
+            outputs = [{'id': component_id, 'property': prop}
+                       for component_id, props in response.items() for prop in props]
+        indexes = []
+        for output in outputs:
+            content = dumps(response[output['id']][output['property']])
+            if content not in positions:
+                positions[content] = len(values)
+                values.append(content)
+            indexes.append(positions[content])
+        states[value] = indexes
+    # The values are already JSON, so the document is assembled from the strings
+    return '{{"outputs":{},"states":{},"values":[{}]}}'.format(dumps(outputs), dumps(states), ','.join(values))
+
+
+# Render every dropdown value and write the page and plotly.js to the output directory
+def export(output=DEFAULT_OUTPUT, workers=None):
+    start = time.perf_counter()
+    # Every output is rendered by the dispatch callback, the page has no clientside
+    # or background callbacks
+    os.environ.pop('HONEY_CLIENTSIDE', None)
+    os.environ.pop('HONEY_BACKGROUND_CALLBACKS', None)
+    version, defaults, values, rendered = render_all(workers, changes=[[]])
+
+    # The layout is taken from the app once the values are rendered
+    import app
+    app.create_app({'data_loading': 'eager', 'reload_interval': 0})
+    output = pathlib.Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    (output / PLOTLY_JS).write_text(get_plotlyjs(), encoding='utf-8')
+    stylesheets = '\n'.join('<link rel="stylesheet" href="{}">'.format(html_text.escape(url))
+                            for url in app.app.config.external_stylesheets)
+    page = PAGE.format(title=TITLE, stylesheets=stylesheets, plotly_js=PLOTLY_JS,
+                       body=to_html(app.serve_layout(), values),
+                       data=page_data(rendered).replace('</', '<\\/'), state_input=STATE_INPUT)
+    index = output / 'index.html'
+    index.write_text(page, encoding='utf-8')
+    print('Exported {} dropdown values (version {}) in {:.1f}s to {} ({:.0f} kB)'.format(
+        len(values), version, time.perf_counter() - start, index, os.path.getsize(index) / 1000))
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the dashboard as a static HTML page')
+    parser.add_argument('--output', default=str(DEFAULT_OUTPUT), help='directory of the site')
+    parser.add_argument('--workers', type=int, default=None, help='rendering processes (default: one per core)')
+    args = parser.parse_args()
+    export(args.output, args.workers)
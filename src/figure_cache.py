@@ -0,0 +1,112 @@
+# Memoization of the callback figures
+# Figures are stored as serialized JSON keyed on (callback, state, dataset version)
+# so a repeated dropdown value is a dictionary lookup instead of a Plotly rebuild.
+# Any backend from cache_backends can stand in for the in-process FigureCache.
+import functools
+import threading
+from collections import OrderedDict
+
+from instrumentation import end_span, mark_cache, phase, start_span
+from serialization import dumps, figure_json, loads
+
+
+class FigureCache:
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            # Mark the entry as most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            # Evict the least recently used entries
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# Decorator caching the JSON-serializable result of a callback of the states dropdown
+# version_func returns the current dataset version so stale entries are never served
+# ignore_input is for callbacks whose result does not depend on their input
+# key_func maps the input to a hashable canonical form (e.g. a list of states to a tuple)
+# Further positional arguments (hashable options of the callback) are part of the key
+# Every call is timed as a span of instrumentation, named after the cache entry
+# With a SingleFlight (see single_flight.py) concurrent misses of the same key share one computation
+def cached_result(cache, name, version_func, ignore_input=False, serialize=dumps, key_func=None, flight=None):
+    def decorator(func):
+        option_count = func.__code__.co_argcount - 1
+        option_defaults = func.__defaults__ or ()
+
+        @functools.wraps(func)
+        def wrapper(state_input, *args):
+            if ignore_input:
+                input_key = None
+            else:
+                input_key = key_func(state_input) if key_func is not None else state_input
+            # Options left to their default share the entries of explicit defaults
+            if len(args) < option_count:
+                args += option_defaults[len(args) - option_count:]
+            key = (name, input_key, version_func()) + args
+            span = start_span(name, input_key)
+            leader = []
+
+            def compute():
+                leader.append(True)
+                result = func(state_input, *args)
+                with phase('serialize'):
+                    payload = serialize(result)
+                cache.put(key, payload)
+                return payload
+
+            try:
+                payload = cache.get(key)
+                if payload is None:
+                    payload = flight.do(key, compute, lambda: cache.get(key)) if flight is not None else compute()
+                    # Callers that got the result of another computation are counted apart
+                    mark_cache('miss' if leader else 'coalesced')
+                else:
+                    mark_cache('hit')
+                with phase('serialize'):
+                    return loads(payload)
+            finally:
+                end_span(span)
+
+        # Keep a handle on the undecorated function
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+# Decorator caching the figure returned by a callback
+def cached_figure(cache, name, version_func, ignore_input=False, key_func=None, flight=None):
+    return cached_result(cache, name, version_func, ignore_input, serialize=figure_json, key_func=key_func,
+                         flight=flight)
+
+
+# Build and cache the figures of the given callbacks for every state
+def warm_up(callbacks, states):
+    for callback in callbacks:
+        for state in states:
+            callback(state)
@@ -0,0 +1,237 @@
+# Figure builders of the dashboard
+# The layouts and the static parts of the traces are validated by Plotly once, at
+# import, and kept as plain dicts. The builders then return raw figure dicts with
+# the data spliced in, skipping Plotly's per-property validation on every call.
+import functools
+
+import plotly.graph_objects as go
+
+from instrumentation import timed_phase
+from serialization import static_fragment
+
+# Colours and fonts of the dashboard
+ORANGE = '#D9560B'
+GREY = '#B4BEC9'
+TITLE_FONT = dict(size=20, color='#0C0B09')
+AXIS_TITLE_FONT = dict(size=14, color='#595959')
+
+# X axis of the line, bar and scatter charts
+X_AXIS = dict(
+    showline=True,
+    showgrid=False,
+    showticklabels=True,
+    linecolor='#D9D9D9',
+    linewidth=2,
+    ticks='outside',
+    tickcolor='#595959',
+    tickfont=dict(
+        color='#595959'
+    )
+)
+
+# Y axis of the line and scatter charts
+Y_AXIS = dict(
+    showline=True,
+    showgrid=False,
+    showticklabels=True,
+    linecolor='#D9D9D9',
+    linewidth=2,
+    tickfont=dict(
+        color='#595959'
+    )
+)
+
+
+# Layout validated by Plotly (with the default template expanded) as a plain dict
+# The layouts are shared by every figure and never modified, so their JSON is kept
+def validated_layout(figure=None, **layout):
+    figure = figure if figure is not None else go.Figure()
+    figure.update_layout(**layout)
+    return static_fragment(figure.to_plotly_json()['layout'])
+
+
+# Trace validated by Plotly as a plain dict
+def validated_trace(trace):
+    return trace.to_plotly_json()
+
+
+# Layout of a line or scatter chart with the given titles
+@functools.lru_cache(maxsize=None)
+def axes_layout(title, x_axis, y_axis):
+    return validated_layout(
+        title=dict(text=title, font=TITLE_FONT),
+        xaxis_title=dict(text=x_axis, font=AXIS_TITLE_FONT),
+        yaxis_title=dict(text=y_axis, font=AXIS_TITLE_FONT),
+        plot_bgcolor='white',
+        showlegend=False,
+        xaxis=X_AXIS,
+        yaxis=Y_AXIS
+    )
+
+
+# Layout of a horizontal bar chart with the given titles
+@functools.lru_cache(maxsize=None)
+def bar_layout(title, x_axis):
+    return validated_layout(
+        title=dict(text=title, font=TITLE_FONT),
+        xaxis_title=dict(text=x_axis, font=AXIS_TITLE_FONT),
+        xaxis=X_AXIS,
+        yaxis=dict(Y_AXIS, showline=False),
+        plot_bgcolor='white'
+    )
+
+
+BAR_LAYOUT = bar_layout('Top Five Honey Production States', 'Total Production')
+
+MAP_LAYOUT = validated_layout(
+    title=dict(text='Total Honey Production States by States', font=TITLE_FONT),
+    geo_scope='usa',
+    margin={"r": 0, "t": 30, "l": 0, "b": 0}
+)
+
+# The baseline of the temperature chart is a shape and an annotation of the layout
+_temperature_figure = go.Figure()
+_temperature_figure.add_hline(y=0, line_color='#8C8C8C', line_width=1,
+                              annotation_text="baseline",
+                              annotation_position="bottom right",
+                              annotation_font_size=14,
+                              annotation_font_color="#8C8C8C")
+TEMPERATURE_LAYOUT = validated_layout(
+    _temperature_figure,
+    title=dict(text='Temperature Anomalies From 1910 to 2022', font=TITLE_FONT),
+    xaxis_title=dict(text='Year', font=AXIS_TITLE_FONT),
+    yaxis_title=dict(text='Anomalies Values', font=AXIS_TITLE_FONT),
+    plot_bgcolor='white',
+    showlegend=False,
+    xaxis=X_AXIS,
+    yaxis=Y_AXIS,
+    coloraxis_colorbar=dict(title='anomalies')
+)
+
+# Same layout with the honey production of the same years on a right-hand axis
+TEMPERATURE_PRODUCTION_LAYOUT = validated_layout(
+    go.Figure(_temperature_figure),
+    title=dict(text='Temperature Anomalies From 1910 to 2022', font=TITLE_FONT),
+    xaxis_title=dict(text='Year', font=AXIS_TITLE_FONT),
+    yaxis_title=dict(text='Anomalies Values', font=AXIS_TITLE_FONT),
+    plot_bgcolor='white',
+    showlegend=True,
+    legend=dict(orientation='h', y=-0.2),
+    xaxis=X_AXIS,
+    yaxis=Y_AXIS,
+    yaxis2=dict(Y_AXIS, title=dict(text='Honey Production', font=AXIS_TITLE_FONT), overlaying='y', side='right')
+)
+
+# Static parts of the traces (named colour scales are expanded by the validation)
+MAP_TRACE = validated_trace(go.Choropleth(locationmode='USA-states', colorscale='Oranges'))
+TEMPERATURE_TRACE = validated_trace(go.Scatter(
+    mode='markers',
+    marker=dict(
+        size=12,
+        colorscale='RdBu',
+        reversescale=True,
+        showscale=True,
+        colorbar=dict(
+            tickvals=[-1.3, 1.99],
+            ticktext=['colder', 'warmer'],
+            ticks='outside'
+        )
+    )
+))
+
+
+# Line chart of a yearly series, with a marker and the percentage change on the last year
+# comparisons holds (name, years, values) of thin lines drawn behind the series
+# An empty series (no data in the year range) has no marker, and a series starting
+# at 0 has no percentage change
+@timed_phase('figure')
+def line_figure(years, values, the_title, y_axis, x_axis, comparisons=()):
+    data = [{'type': 'scatter', 'x': comparison_years, 'y': comparison_values, 'name': name,
+             'line': {'color': GREY, 'width': 1}, 'connectgaps': True}
+            for name, comparison_years, comparison_values in comparisons]
+    data.append({'type': 'scatter', 'x': years, 'y': values,
+                 'line': {'color': ORANGE, 'width': 3}, 'connectgaps': True})
+    layout = dict(axes_layout(the_title, x_axis, y_axis))
+    if not len(values):
+        return {'data': data, 'layout': layout}
+
+    # Calculations for the percentage change
+    first_value = int(values[0])
+    last_value = int(values[-1])
+
+    data.append({'type': 'scatter', 'x': [years[-1]], 'y': [last_value], 'mode': 'markers',
+                 'marker': {'color': ORANGE, 'size': 10}})
+    if first_value != 0:
+        layout['annotations'] = [{
+            'font': {'color': ORANGE, 'size': 14},
+            'showarrow': False,
+            'text': '{}%'.format(round(((last_value - first_value) / first_value) * 100, 1)),
+            'x': years[-1] + 2,
+            'y': last_value
+        }]
+    return {'data': data, 'layout': layout}
+
+
+# Horizontal bar chart of ranked states, listed from the bottom bar to the top one
+# Without highlight the two top bars are orange, otherwise the highlighted states
+@timed_phase('figure')
+def bar_figure(states, values, title='Top Five Honey Production States', x_axis='Total Production',
+               text=None, highlight=None):
+    if highlight is None:
+        colors = [GREY] * max(len(states) - 2, 0) + [ORANGE] * min(len(states), 2)
+    else:
+        colors = [ORANGE if state in highlight else GREY for state in states]
+    if text is None:
+        text = ['{:,}M'.format(round(i / 1000000, 1)) for i in values]
+    data = [{'type': 'bar', 'x': values, 'y': states,
+             'marker': {'color': colors},
+             'name': title,
+             'orientation': 'h',
+             'text': text,
+             'textfont': {'color': 'white', 'size': 14},
+             'textposition': 'inside'}]
+    return {'data': data, 'layout': bar_layout(title, x_axis)}
+
+
+# Choropleth map of the production by state code
+@timed_phase('figure')
+def map_figure(codes, production, names, showscale=None):
+    trace = dict(MAP_TRACE, locations=codes, z=production, text=names)
+    if showscale is not None:
+        trace['showscale'] = showscale
+    return {'data': [trace], 'layout': MAP_LAYOUT}
+
+
+# Bubble chart of the production against the number of colonies
+@timed_phase('figure')
+def bubble_figure(states, production, colonies_number):
+    # The size of the dots
+    size = production + colonies_number
+    data = [{'type': 'scatter', 'x': production, 'y': colonies_number, 'mode': 'markers', 'text': states,
+             'marker': {'size': size, 'sizemode': 'area', 'sizeref': 2. * max(size) / (70. ** 2),
+                        'color': ORANGE}}]
+    return {'data': data, 'layout': axes_layout('Production vs Number of Colonies by States',
+                                                'Number of Colonies', 'Total Production')}
+
+
+# Scatter of the temperature anomalies coloured by their value
+# rolling is the rolling mean of the anomalies, drawn as a line, and production
+# the (years, values) of the honey production, drawn on a right-hand axis
+@timed_phase('figure')
+def temperature_figure(years, values, rolling=None, production=None):
+    trace = dict(TEMPERATURE_TRACE, x=years, y=values)
+    trace['marker'] = dict(TEMPERATURE_TRACE['marker'], color=values)
+    if rolling is None and production is None:
+        return {'data': [trace], 'layout': TEMPERATURE_LAYOUT}
+
+    # The colour bar is moved right of the production axis
+    trace['name'] = 'Anomaly'
+    trace['marker']['colorbar'] = dict(trace['marker']['colorbar'], x=1.15)
+    data = [trace]
+    if rolling is not None:
+        data.append({'type': 'scatter', 'x': years, 'y': rolling, 'mode': 'lines', 'name': 'Rolling mean',
+                     'line': {'color': '#595959', 'width': 2}})
+    if production is not None:
+        data.append({'type': 'scatter', 'x': production[0], 'y': production[1], 'mode': 'lines',
+                     'name': 'Honey production', 'yaxis': 'y2', 'line': {'color': ORANGE, 'width': 2}})
+    return {'data': data, 'layout': TEMPERATURE_PRODUCTION_LAYOUT}
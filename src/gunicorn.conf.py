@@ -0,0 +1,25 @@
+# Gunicorn settings, read from the working directory (gunicorn --chdir src app:server)
+import sys
+
+
+# The app module, when the master created the app before forking (--preload)
+def preloaded_app():
+    app = sys.modules.get('app')
+    if app is not None and app.APP_CONFIGS:
+        return app
+    return None
+
+
+# The master serves no request: its data watcher would only unshare the snapshot
+# pages of the workers forked later
+def when_ready(server):
+    app = preloaded_app()
+    if app is not None:
+        app.stop_data_watcher()
+
+
+# Start the watcher (and the warm-up, if still needed) of every serving worker
+def post_fork(server, worker):
+    app = preloaded_app()
+    if app is not None:
+        app.after_fork(app.APP_CONFIGS[-1])
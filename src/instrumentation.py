@@ -0,0 +1,294 @@
+# Timing of the callbacks and of the requests
+# Every cached callback runs in a span that splits its time into phases:
+#   data      - reading the snapshot (the callback body minus the figure builders)
+#   figure    - the figure builders of figures.py
+#   serialize - JSON encoding of the result and decoding of the cached payload
+# The spans are aggregated into histograms rendered in the Prometheus text format
+# on /metrics. Optionally every request is logged as one JSON line, and one in N
+# requests is run under cProfile with the profile written to disk.
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PHASES = ('data', 'figure', 'serialize', 'total')
+# Distinct input values counted per callback, the rest are counted as 'other'
+MAX_INPUT_VALUES = 500
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Span:
+    def __init__(self, name, input_key):
+        self.name = name
+        self.input_key = input_key
+        self.phases = defaultdict(float)
+        self.cache = None
+        self.start = time.perf_counter()
+
+
+class Metrics:
+    def __init__(self):
+        self.callback_seconds = defaultdict(Histogram)
+        self.request_seconds = defaultdict(Histogram)
+        self.cache_results = defaultdict(int)
+        self.inputs = defaultdict(lambda: defaultdict(int))
+        # Seconds of every phase of the startup of the process, in the order they ran
+        self.startup = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    # Extra metrics rendered on /metrics, collector returns {name: value}
+    # Names ending in _total are counters, the others gauges
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def record_span(self, span, total):
+        # Whatever is neither figure nor serialization was spent reading the data
+        span.phases['data'] = max(total - span.phases['figure'] - span.phases['serialize'], 0.0)
+        span.phases['total'] = total
+        input_label = input_value_label(span.input_key)
+        with self._lock:
+            for phase_name in PHASES:
+                self.callback_seconds[(span.name, phase_name)].observe(span.phases[phase_name])
+            if span.cache is not None:
+                self.cache_results[(span.name, span.cache)] += 1
+            counts = self.inputs[span.name]
+            if input_label not in counts and len(counts) >= MAX_INPUT_VALUES:
+                input_label = 'other'
+            counts[input_label] += 1
+
+    def record_startup(self, phase_name, seconds):
+        with self._lock:
+            self.startup[phase_name] = self.startup.get(phase_name, 0.0) + seconds
+
+    def record_request(self, path, status, seconds):
+        with self._lock:
+            self.request_seconds[(path, str(status))].observe(seconds)
+
+    # Prometheus text exposition format
+    def render(self):
+        lines = []
+        with self._lock:
+            _render_histogram(lines, 'honey_callback_seconds', 'Callback time by phase',
+                              ('callback', 'phase'), self.callback_seconds)
+            _render_histogram(lines, 'honey_request_seconds', 'Request time by path and status',
+                              ('path', 'status'), self.request_seconds)
+            lines.append('# HELP honey_callback_cache_total Cache lookups of the callbacks')
+            lines.append('# TYPE honey_callback_cache_total counter')
+            for (name, result), value in sorted(self.cache_results.items()):
+                lines.append('honey_callback_cache_total{{callback="{}",result="{}"}} {}'.format(
+                    name, result, value))
+            lines.append('# HELP honey_callback_inputs_total Calls of the callbacks by input value')
+            lines.append('# TYPE honey_callback_inputs_total counter')
+            for name, counts in sorted(self.inputs.items()):
+                for input_label, value in sorted(counts.items()):
+                    lines.append('honey_callback_inputs_total{{callback="{}",input="{}"}} {}'.format(
+                        name, _escape(input_label), value))
+            lines.append('# HELP honey_startup_seconds Time of the startup phases of the process')
+            lines.append('# TYPE honey_startup_seconds gauge')
+            for phase_name, value in self.startup.items():
+                lines.append('honey_startup_seconds{{phase="{}"}} {}'.format(phase_name, value))
+        for collector in self.collectors:
+            for name, value in sorted(collector().items()):
+                lines.append('# TYPE {} {}'.format(name, 'counter' if name.endswith('_total') else 'gauge'))
+                lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _render_histogram(lines, metric, description, label_names, histograms):
+    lines.append('# HELP {} {}'.format(metric, description))
+    lines.append('# TYPE {} histogram'.format(metric))
+    for label_values, histogram in sorted(histograms.items()):
+        labels = ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(label_names, label_values))
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(metric, labels, bound, cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(metric, labels, histogram.sum))
+        lines.append('{}_count{{{}}} {}'.format(metric, labels, histogram.count))
+
+
+# Label of a canonical dropdown value ('All', a state or a tuple of states)
+def input_value_label(input_key):
+    if input_key is None:
+        return ''
+    if isinstance(input_key, tuple):
+        return '+'.join(map(str, input_key))
+    return str(input_key)
+
+
+# Metrics of this process
+metrics = Metrics()
+
+
+# Open a span for a callback call, closed by end_span
+def start_span(name, input_key):
+    span = Span(name, input_key)
+    stack = getattr(_local, 'spans', None)
+    if stack is None:
+        stack = _local.spans = []
+    stack.append(span)
+    return span
+
+
+def end_span(span):
+    total = time.perf_counter() - span.start
+    _local.spans.remove(span)
+    metrics.record_span(span, total)
+    # Keep the spans of the current request for its log line
+    request_spans = getattr(_local, 'request_spans', None)
+    if request_spans is not None:
+        request_spans.append(span)
+
+
+# Add the time of a block to a phase of the innermost open span (a no-op outside of spans)
+@contextlib.contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack = getattr(_local, 'spans', None)
+        if stack:
+            stack[-1].phases[name] += time.perf_counter() - start
+
+
+# Decorator timing a function as a phase
+def timed_phase(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Time a phase of the startup (import, data load, aggregates, layout...)
+@contextlib.contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_startup(name, time.perf_counter() - start)
+
+
+# Seconds of the startup phases that ran so far, by phase
+def startup_report():
+    with metrics._lock:
+        return dict(metrics.startup)
+
+
+# Record the cache lookup ('hit' or 'miss') of the innermost open span
+def mark_cache(result):
+    stack = getattr(_local, 'spans', None)
+    if stack:
+        stack[-1].cache = result
+
+
+class RequestInstrumentation:
+    # Flask hooks timing every request
+    # log_requests writes one JSON line per request with the spans of its callbacks
+    # profile_every runs one request in N under cProfile, dumped to profile_dir
+    def __init__(self, server, log_requests=False, profile_every=0, profile_dir=None):
+        self.log_requests = log_requests
+        self.profile_every = profile_every
+        self.profile_dir = profile_dir or os.path.join(tempfile.gettempdir(), 'us_honey_profiles')
+        self._requests = 0
+        self._lock = threading.Lock()
+        if profile_every:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        server.before_request(self.before_request)
+        server.after_request(self.after_request)
+
+    # Number of the request when it is sampled for profiling, otherwise None
+    def _sample(self):
+        if not self.profile_every:
+            return None
+        with self._lock:
+            self._requests += 1
+            return self._requests if self._requests % self.profile_every == 0 else None
+
+    def before_request(self):
+        _local.request_start = time.perf_counter()
+        _local.request_spans = []
+        _local.profile = None
+        sample = self._sample()
+        if sample is not None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                _local.profile = profile
+                _local.sample = sample
+            except ValueError:
+                # Another profiler is active in this thread
+                pass
+
+    def after_request(self, response):
+        start = getattr(_local, 'request_start', None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        _local.request_start = None
+        # The route rather than the path, so unknown URLs do not add labels
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.record_request(route, response.status_code, seconds)
+
+        profile = getattr(_local, 'profile', None)
+        if profile is not None:
+            profile.disable()
+            _local.profile = None
+            path = os.path.join(self.profile_dir, '{}-{}-{}-{}.prof'.format(
+                time.strftime('%Y%m%d-%H%M%S'), os.getpid(), _local.sample,
+                request.path.strip('/').replace('/', '_') or 'index'))
+            profile.dump_stats(path)
+
+        spans = getattr(_local, 'request_spans', None) or []
+        _local.request_spans = None
+        if self.log_requests:
+            logger.info(json.dumps({
+                'path': request.path,
+                'status': response.status_code,
+                'ms': round(seconds * 1000, 3),
+                'callbacks': [{'callback': span.name, 'input': input_value_label(span.input_key),
+                               'cache': span.cache,
+                               'ms': {phase_name: round(span.phases[phase_name] * 1000, 3)
+                                      for phase_name in PHASES}}
+                              for span in spans],
+            }))
+        return response
@@ -0,0 +1,97 @@
+# Key figures of the overview section, precomputed per snapshot
+# The KPIs of 'All' and of every state are computed together from the cube in a
+# few array passes and kept with their display strings, so the overview callback
+# is a single lookup. Multi-state selections go through the same vectorized code
+# with one row of weights.
+import numpy as np
+
+# Totals shown on the overview cards (cube metric of each card)
+TOTAL_KPIS = [('total_production', 'production'), ('total_colonies', 'colonies_number'),
+              ('total_stocks', 'stocks'), ('total_value_production', 'value_of_production')]
+# Derived KPIs shown under the cards
+TREND_KPIS = ['production_change', 'yield_per_colony', 'price_trend']
+KPIS = [name for name, metric in TOTAL_KPIS] + TREND_KPIS
+# Prices under this value are in dollars per pound
+PRICE_DOLLARS_BELOW = 20
+
+
+def millions(value):
+    return '{:,}M'.format(round(value / 1000000, 1))
+
+
+# Display format of every KPI
+FORMATS = {
+    'total_production': millions,
+    'total_colonies': millions,
+    'total_stocks': millions,
+    'total_value_production': millions,
+    'production_change': lambda value: '{:+.1f}%'.format(value),
+    'yield_per_colony': lambda value: '{:.1f} lbs'.format(value),
+    'price_trend': lambda value: '{:+.2f}¢/lb per year'.format(value),
+}
+
+
+def _format(name, value):
+    if np.isnan(value):
+        return 'n/a'
+    return FORMATS[name](value)
+
+
+# KPI values of every row of weights (rows x states) over a resolved year range,
+# as a rows x KPIS array
+def kpi_values(cube, weights, years=None):
+    y = cube.year_slice(years)
+    if y.stop <= y.start:
+        # No year of the data in the range (a gap of the years): zero totals and no trend
+        return np.hstack([np.zeros((len(weights), len(TOTAL_KPIS))), np.full((len(weights), len(TREND_KPIS)), np.nan)])
+    totals = weights @ cube.range_totals(years)
+    production = weights @ cube.values[:, y, cube.metric_pos['production']]
+    # average_price is in cents per pound up to 2017 and in dollars from 2018
+    price = cube.values[:, y, cube.metric_pos['average_price']]
+    price = np.where(cube.present[:, y] & (price < PRICE_DOLLARS_BELOW), price * 100, price)
+    price_sum = weights @ price
+    state_count = weights @ cube.present[:, y]
+    present = state_count > 0
+    rows = np.arange(len(weights))
+
+    columns = [totals[:, cube.metric_pos[metric]] for name, metric in TOTAL_KPIS]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Percentage change of the production from the first to the last year with data
+        first = present.argmax(axis=1)
+        last = present.shape[1] - 1 - present[:, ::-1].argmax(axis=1)
+        first_production = production[rows, first]
+        columns.append((production[rows, last] - first_production) / first_production * 100)
+        # Pounds per colony, over all the years
+        columns.append(totals[:, cube.metric_pos['production']] / totals[:, cube.metric_pos['colonies_number']])
+        # Least squares slope of the yearly price, averaged over the states with data
+        n = present.sum(axis=1)
+        x = np.where(present, cube.years[y].astype(np.float64), 0)
+        p = np.where(present, price_sum / state_count, 0)
+        sx, sp = x.sum(axis=1), p.sum(axis=1)
+        slope = (n * (x * p).sum(axis=1) - sx * sp) / (n * (x * x).sum(axis=1) - sx * sx)
+        columns.append(np.where(n > 1, slope, np.nan))
+    return np.column_stack(columns)
+
+
+class KpiTable:
+    # KPIs of 'All' (row 0) and of every state of the cube
+    def __init__(self, cube):
+        self.cube = cube
+        self.values = kpi_values(cube, cube.weights_matrix())
+        self.strings = [self._strings(values) for values in self.values]
+
+    @staticmethod
+    def _strings(values):
+        return {name: _format(name, value) for name, value in zip(KPIS, values)}
+
+    # Display strings of the KPIs of a resolved selection over a resolved year range
+    # (the table covers all the years, a range is computed from the prefix sums)
+    def lookup(self, selection, years=None):
+        row = self.cube.row_of(selection)
+        if row is not None and years is None:
+            return self.strings[row]
+        if isinstance(selection, str) and selection != 'All' and selection not in self.cube.state_pos:
+            # A state absent from the data has zero totals and no trend
+            return self._strings([0.0] * len(TOTAL_KPIS) + [np.nan] * len(TREND_KPIS))
+        weights = self.cube.selection_weights(selection)
+        return self._strings(kpi_values(self.cube, weights[np.newaxis], years)[0])
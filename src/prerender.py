@@ -0,0 +1,212 @@
+# Prerendered responses of the dispatch callback
+# The dropdown only offers a few dozen values, so the responses of the dispatch
+# callback for every value (with the default ranking and year range) are rendered
+# ahead of time by a pool of processes and written to a compressed artefact
+# tagged with the dataset version. A server started with the artefact answers
+# these requests from memory with the bytes rendered at build time; the other
+# requests (ranking controls, year ranges, several states) and every request
+# after a data refresh still run the callbacks.
+# The responses are keyed on the outputs of the dispatch callback, which depend on
+# the mode of the app: build the artefact with the HONEY_CLIENTSIDE and
+# HONEY_BACKGROUND_CALLBACKS settings of the server that serves it.
+#
+# Build the artefact with: python prerender.py build [--workers N] [--output PATH]
+# and serve it with HONEY_PRERENDERED=PATH
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Response, request
+
+from datastore import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+DEFAULT_PATH = DATA_DIR / 'prerendered.json.gz'
+UPDATE_PATH = '_dash-update-component'
+STATE_INPUT = 'input-state'
+# Output of the dispatch callback only (the background callback also has the dropdown input)
+DISPATCH_OUTPUT = 'top-production.figure'
+
+
+# Dropdown value with 'All' dropped when states are picked along with it,
+# which the callbacks ignore (see HoneyCube.resolve)
+def state_value(value):
+    if isinstance(value, list) and len(value) > 1:
+        return [v for v in value if v != 'All'] or ['All']
+    return value
+
+
+# Key of a callback request: its outputs, input values (missing values replaced
+# by their defaults) and the inputs that triggered it
+def request_key(body, defaults):
+    inputs = [[i['id'], i['property'], i.get('value') if i.get('value') is not None else defaults.get(i['id'])]
+              for i in body['inputs']]
+    inputs = [[id_, prop, state_value(value) if id_ == STATE_INPUT else value] for id_, prop, value in inputs]
+    return json.dumps([body['output'], inputs, sorted(body.get('changedPropIds') or [])], sort_keys=True)
+
+
+# Inputs changed by the requests that are rendered: the first call of a page and a
+# change of the dropdown
+CHANGES = [[], [STATE_INPUT + '.value']]
+
+
+# Request bodies of the dispatch callback for a dropdown value, one per change
+def request_bodies(dependency, value, defaults, changes=CHANGES):
+    if dependency['output'].startswith('..'):
+        outputs = [dict(zip(['id', 'property'], output.split('.')))
+                   for output in dependency['output'][2:-2].split('...')]
+    else:
+        outputs = dict(zip(['id', 'property'], dependency['output'].split('.')))
+    body = {
+        'output': dependency['output'],
+        'outputs': outputs,
+        'inputs': [{'id': i['id'], 'property': i['property'],
+                    'value': [value] if i['id'] == STATE_INPUT else defaults.get(i['id'])}
+                   for i in dependency['inputs']],
+        'state': [{'id': s['id'], 'property': s['property']} for s in dependency.get('state', [])],
+    }
+    return [dict(body, changedPropIds=changed) for changed in changes]
+
+
+# The app imported by every build process
+_app = None
+
+
+def _init_worker():
+    global _app
+    import app
+    app.create_app({'data_loading': 'eager'})
+    _app = app
+
+
+# Dataset version, input defaults and dropdown values of the app
+def _describe():
+    cube = _app.data_store.current().cube
+    defaults = dict(_app.RANKING_CONTROLS)
+    defaults[_app.YEAR_CONTROL] = [int(cube.years[0]), int(cube.years[-1])]
+    values = [option['value'] for option in _app.serve_layout()[STATE_INPUT].options]
+    return _app.dataset_version(), defaults, values
+
+
+# Responses of the dispatch callback for some dropdown values, as (value, request key, body)
+def _render(values, defaults, changes):
+    client = _app.server.test_client()
+    prefix = _app.app.config.routes_pathname_prefix
+    dependencies = client.get(prefix + '_dash-dependencies').get_json()
+    dispatch = [dependency for dependency in dependencies if not dependency.get('clientside_function')
+                and DISPATCH_OUTPUT in dependency['output'].split('...')
+                and any(i['id'] == STATE_INPUT for i in dependency['inputs'])][0]
+    responses = []
+    for value in values:
+        for body in request_bodies(dispatch, value, defaults, changes):
+            response = client.post(prefix + UPDATE_PATH, json=body)
+            if response.status_code != 200:
+                raise RuntimeError('{} answered {} for {!r}'.format(UPDATE_PATH, response.status_code, value))
+            responses.append((value, request_key(body, defaults), response.get_data(as_text=True)))
+    return _app.dataset_version(), responses
+
+
+# Render the responses of every dropdown value in a pool of processes
+# Returns the dataset version, the input defaults, the dropdown values and the
+# (value, request key, body) of every response
+def render_all(workers=None, changes=CHANGES):
+    # The build processes compute every response themselves, with the outputs of the server's mode
+    os.environ.pop('HONEY_PRERENDERED', None)
+    os.environ['HONEY_COMPRESS'] = '0'
+    os.environ['HONEY_RELOAD_INTERVAL'] = '0'
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        version, defaults, values = executor.submit(_describe).result()
+        # A few chunks per process so the slow values (the regions) do not leave cores idle
+        chunk_count = workers * 4
+        chunks = [values[i::chunk_count] for i in range(chunk_count) if values[i::chunk_count]]
+        responses = []
+        for chunk_version, chunk in executor.map(_render, chunks, [defaults] * len(chunks),
+                                                 [changes] * len(chunks)):
+            if chunk_version != version:
+                raise RuntimeError('The data changed during the rendering, run it again')
+            responses += chunk
+    return version, defaults, values, responses
+
+
+# Render every dropdown value and write the artefact
+def build(output=DEFAULT_PATH, workers=None):
+    start = time.perf_counter()
+    version, defaults, values, rendered = render_all(workers)
+    responses = {key: body for value, key, body in rendered}
+
+    artefact = {'format': FORMAT, 'version': version, 'created': time.time(), 'defaults': defaults,
+                'responses': responses}
+    # Write next to the target and swap it in so a starting server never reads half an artefact
+    output = str(output)
+    staging = output + '.tmp'
+    with gzip.open(staging, 'wt', compresslevel=9) as f:
+        json.dump(artefact, f, separators=(',', ':'))
+    os.replace(staging, output)
+    print('Rendered {} responses for {} dropdown values (version {}) in {:.1f}s to {}'.format(
+        len(responses), len(values), version, time.perf_counter() - start, output))
+    return output
+
+
+class PrerenderedResponses:
+    # version_func returns the dataset version the callback results depend on
+    def __init__(self, server, path, version_func, routes_prefix='/'):
+        with gzip.open(path, 'rt') as f:
+            artefact = json.load(f)
+        if artefact.get('format') != FORMAT:
+            raise ValueError('{} is not a prerendered artefact of format {}'.format(path, FORMAT))
+        self.version = artefact['version']
+        self.version_func = version_func
+        self.defaults = artefact['defaults']
+        self.update_path = routes_prefix + UPDATE_PATH
+        # Bodies and their gzip encoding, compressed once at startup
+        self.responses = {}
+        for key, body in artefact['responses'].items():
+            body = body.encode()
+            self.responses[key] = (body, gzip.compress(body, mtime=0))
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        if self.version != version_func():
+            logger.warning('%s was rendered from version %s of the data, not %s: its responses are not served',
+                           path, self.version, version_func())
+        server.before_request(self.before_request)
+
+    def before_request(self):
+        if request.method != 'POST' or request.path != self.update_path:
+            return None
+        # Responses of another version of the data are never served
+        if self.version_func() != self.version:
+            self.stale += 1
+            return None
+        body = request.get_json(silent=True, cache=True)
+        try:
+            response = self.responses.get(request_key(body, self.defaults))
+        except (TypeError, KeyError):
+            response = None
+        if response is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if request.accept_encodings['gzip']:
+            return Response(response[1], mimetype='application/json',
+                            headers={'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+        return Response(response[0], mimetype='application/json')
+
+    def stats(self):
+        return {'responses': len(self.responses), 'hits': self.hits, 'misses': self.misses, 'stale': self.stale}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the responses of every dropdown value ahead of time')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--output', default=str(DEFAULT_PATH), help='path of the artefact')
+    parser.add_argument('--workers', type=int, default=None, help='build processes (default: one per core)')
+    args = parser.parse_args()
+    build(args.output, args.workers)
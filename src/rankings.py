@@ -0,0 +1,92 @@
+# Rankings of the states by metric and year range, precomputed per snapshot
+# The totals of every contiguous year range come from the prefix sums of the cube,
+# and the states are presorted once per (range, metric), so a top-N or bottom-N
+# query and the rank of a state are array slices instead of a sort of all states.
+import numpy as np
+
+# Metrics the states can be ranked on, with their axis label
+RANKING_METRICS = {
+    'production': 'Total Production',
+    'colonies_number': 'Number of Colonies',
+    'value_of_production': 'Value of Production',
+    'yield_per_colony': 'Yield per Colony',
+}
+
+
+class RankingIndex:
+    def __init__(self, cube):
+        self.states = cube.states
+        self.state_pos = cube.state_pos
+        self.years = cube.years
+        self.year_slice = cube.year_slice
+        n_years = len(cube.years)
+
+        # Totals over the year range [first, last] of every pair of year positions,
+        # from the prefix sums of the cube
+        first, last = np.triu_indices(n_years)
+        self.range_pos = {(int(i), int(j)): r for r, (i, j) in enumerate(zip(first, last))}
+        totals = (cube.cumulative[:, last + 1] - cube.cumulative[:, first]).transpose(1, 0, 2)
+        present = (cube.cumulative_present[:, last + 1] - cube.cumulative_present[:, first]).T > 0
+
+        # Per (range, state) values of every ranking metric
+        self.values = {}
+        for metric in RANKING_METRICS:
+            if metric == 'yield_per_colony':
+                # Pounds per colony over the range rather than a sum of yearly yields
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    values = totals[:, :, cube.metric_pos['production']] / \
+                        totals[:, :, cube.metric_pos['colonies_number']]
+            else:
+                values = totals[:, :, cube.metric_pos[metric]]
+            self.values[metric] = np.where(present, values, np.nan)
+
+        # States in descending order of every metric, the states without data last
+        self.count = present.sum(axis=1)
+        self.order = {}
+        self.rank = {}
+        for metric, values in self.values.items():
+            order = np.argsort(np.where(np.isnan(values), np.inf, -values), axis=1, kind='stable')
+            rank = np.empty_like(order)
+            np.put_along_axis(rank, order, np.arange(order.shape[1])[np.newaxis], axis=1)
+            self.order[metric] = order
+            self.rank[metric] = rank
+
+    # Row of a year range resolved by the cube (None for all the years), None when
+    # no year of the data is in the range (a gap of the years)
+    def _range(self, years):
+        y = self.year_slice(years)
+        return self.range_pos.get((y.start, y.stop - 1))
+
+    # Positions of the n first states (bottom=False) or n last states with data,
+    # from the first of the ranking
+    def positions(self, metric, n, years=None, bottom=False):
+        r = self._range(years)
+        if r is None:
+            return np.zeros(0, dtype=np.intp)
+        count = self.count[r]
+        if bottom:
+            return self.order[metric][r, max(count - n, 0):count][::-1]
+        return self.order[metric][r, :min(n, count)]
+
+    # States and values of the top or bottom n states, from the first of the ranking
+    def query(self, metric, n, years=None, bottom=False):
+        positions = self.positions(metric, n, years, bottom)
+        r = self._range(years)
+        if r is None:
+            return self.states[positions], np.zeros(0)
+        return self.states[positions], self.values[metric][r, positions]
+
+    # 1-based rank of a state, None when it has no data over the range
+    def rank_of(self, metric, state, years=None):
+        s = self.state_pos.get(state)
+        r = self._range(years)
+        if s is None or r is None or np.isnan(self.values[metric][r, s]):
+            return None
+        return int(self.rank[metric][r, s]) + 1
+
+    # Value of a metric for a state over a year range (NaN without data)
+    def value_of(self, metric, state, years=None):
+        r = self._range(years)
+        if r is None:
+            return np.nan
+        return self.values[metric][r, self.state_pos[state]]
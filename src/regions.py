@@ -0,0 +1,27 @@
+# US Census regions, selectable in the states dropdown
+# State names are spelled as in the honey dataset (no spaces)
+REGIONS = {
+    'Northeast': ['Connecticut', 'Maine', 'Massachusetts', 'NewHampshire', 'RhodeIsland', 'Vermont',
+                  'NewJersey', 'NewYork', 'Pennsylvania'],
+    'Midwest': ['Illinois', 'Indiana', 'Michigan', 'Ohio', 'Wisconsin', 'Iowa', 'Kansas', 'Minnesota',
+                'Missouri', 'Nebraska', 'NorthDakota', 'SouthDakota'],
+    'South': ['Delaware', 'Florida', 'Georgia', 'Maryland', 'NorthCarolina', 'SouthCarolina', 'Virginia',
+              'WestVirginia', 'Alabama', 'Kentucky', 'Mississippi', 'Tennessee', 'Arkansas', 'Louisiana',
+              'Oklahoma', 'Texas'],
+    'West': ['Arizona', 'Colorado', 'Idaho', 'Montana', 'Nevada', 'NewMexico', 'Utah', 'Wyoming', 'Alaska',
+             'California', 'Hawaii', 'Oregon', 'Washington'],
+}
+
+# Dropdown values of the regions
+REGION_PREFIX = 'Region: '
+
+
+def region_options():
+    return [REGION_PREFIX + name for name in REGIONS]
+
+
+# Member states of a dropdown value, None when it is not a region
+def region_members(value):
+    if isinstance(value, str) and value.startswith(REGION_PREFIX):
+        return REGIONS.get(value[len(REGION_PREFIX):], [])
+    return None
@@ -0,0 +1,69 @@
+# Column schemas of the data files
+# A schema declares the dtype of every column to keep (anything else, like the
+# stray 'Unnamed: 0' index column of the honey CSV, is dropped) and the order
+# of the rows. The honey rows are grouped by state then year.
+#
+# Print the memory used per column before/after with: python schema.py
+import hashlib
+import json
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+
+class Schema:
+    def __init__(self, columns, sort_by=()):
+        self.columns = columns
+        self.sort_by = list(sort_by)
+
+    # Keep the declared columns, cast them and order the rows
+    def apply(self, data):
+        data = data[[column for column in self.columns if column in data.columns]]
+        data = data.astype({column: dtype for column, dtype in self.columns.items() if column in data.columns})
+        if self.sort_by:
+            data = data.sort_values(self.sort_by, kind='stable').reset_index(drop=True)
+        return data
+
+    # Short fingerprint of the schema, stored with the binary artefacts
+    def signature(self):
+        description = json.dumps([[column, str(np.dtype(dtype)) if dtype != 'category' else dtype]
+                                  for column, dtype in self.columns.items()] + self.sort_by)
+        return hashlib.sha1(description.encode()).hexdigest()[:12]
+
+
+# US honey dataset, rows grouped by state then year
+HONEY_SCHEMA = Schema({
+    'state': 'category',
+    'colonies_number': np.int32,
+    'yield_per_colony': np.int32,
+    'production': np.int32,
+    'stocks': np.int32,
+    'average_price': np.float32,
+    'value_of_production': np.int32,
+    'year': np.int16,
+}, sort_by=['state', 'year'])
+
+# North America temperature anomalies
+# (the anomaly values are plotted as they are, so they keep their exact decimals)
+TEMPERATURE_SCHEMA = Schema({
+    'Year': np.int16,
+    'Value': np.float64,
+})
+
+
+# Bytes used by every column of two versions of the same data
+def memory_report(before, after):
+    before_usage = before.memory_usage(index=False, deep=True)
+    after_usage = after.memory_usage(index=False, deep=True)
+    report = {}
+    for column in before_usage.index.union(after_usage.index, sort=False):
+        report[column] = {'before': int(before_usage.get(column, 0)), 'after': int(after_usage.get(column, 0))}
+    report['total'] = {'before': int(before_usage.sum()), 'after': int(after_usage.sum())}
+    return report
+
+
+if __name__ == '__main__':
+    raw = pd.read_csv(pathlib.Path(__file__).resolve().parent / 'data' / 'US_honey_dataset_updated.csv')
+    for column, usage in memory_report(raw, HONEY_SCHEMA.apply(raw)).items():
+        print('{:<22} {:>10,} B -> {:>10,} B'.format(column, usage['before'], usage['after']))
@@ -0,0 +1,63 @@
+# JSON encoding of the callback results
+# orjson (when installed) encodes NumPy arrays from the cube directly instead of
+# walking them element by element, and the static layouts of figures.py are
+# encoded once and spliced into every figure that uses them.
+import json
+
+import numpy as np
+from _plotly_utils.utils import PlotlyJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Pre-serialized static objects by id (the object is kept so its id is never reused)
+_fragments = {}
+
+
+# Arrays orjson cannot encode natively: strings, objects and non-contiguous views
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in 'biuf':
+            return np.ascontiguousarray(obj)
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('Type is not JSON serializable: {}'.format(type(obj).__name__))
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, cls=PlotlyJSONEncoder, separators=(',', ':'))
+
+
+def loads(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+# Mark an object that is never modified, so its JSON is computed once
+def static_fragment(obj):
+    _fragments[id(obj)] = (obj, dumps(obj))
+    return obj
+
+
+def _fragment(obj):
+    fragment = _fragments.get(id(obj))
+    if fragment is not None and fragment[0] is obj:
+        return fragment[1]
+    return None
+
+
+# JSON of a figure dict (or None), reusing the JSON of a static layout
+def figure_json(figure):
+    if figure is None:
+        return 'null'
+    layout = _fragment(figure.get('layout'))
+    if layout is None:
+        return dumps(figure)
+    return '{{"data":{},"layout":{}}}'.format(dumps(figure['data']), layout)
@@ -0,0 +1,90 @@
+# Coalescing of concurrent identical computations (single flight)
+# The first caller of a key computes the result while the callers that arrive
+# before it finishes wait for it and share the result, instead of computing the
+# same figure in parallel. With a lock directory the computation of a key is
+# also serialized across the worker processes of the machine: a process that
+# waited on the file lock checks the shared cache again before computing.
+import hashlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # lock_dir enables the file locks between processes (Unix only), split into
+    # lock_stripes files by hash of the key
+    # Waiters stop waiting after timeout seconds and compute the result themselves
+    def __init__(self, lock_dir=None, lock_stripes=64, timeout=30.0):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.lock_stripes = lock_stripes
+        self.timeout = timeout
+        if self.lock_dir is not None:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self.calls = 0
+        self.coalesced = 0
+        self.process_coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    # Result of func() for a key, computed once for the concurrent callers
+    # recheck returns the result computed by another process (None when there is none),
+    # it is called once the file lock of the key is held
+    def do(self, key, func, recheck=None):
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+        if not leader:
+            if call.done.wait(self.timeout):
+                with self._lock:
+                    self.coalesced += 1
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # The computation is stuck, do not wait for it any longer
+            return func()
+
+        try:
+            call.result = self._compute(key, func, recheck)
+            return call.result
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def _compute(self, key, func, recheck):
+        if self.lock_dir is None:
+            return func()
+        stripe = int(hashlib.sha1(repr(key).encode()).hexdigest(), 16) % self.lock_stripes
+        with open(os.path.join(self.lock_dir, 'flight-{}.lock'.format(stripe)), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                result = recheck() if recheck is not None else None
+                if result is not None:
+                    with self._lock:
+                        self.process_coalesced += 1
+                    return result
+                return func()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'process_coalesced': self.process_coalesced,
+                    'in_flight': len(self._in_flight)}
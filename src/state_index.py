@@ -0,0 +1,54 @@
+# Reference data of the US states, loaded once at startup
+# Maps a state name to its USPS code and coordinates, and pre-merges the
+# production totals of the cube into the base table of the choropleth map
+import numpy as np
+import pandas as pd
+
+
+class StateIndex:
+    def __init__(self, path):
+        states_lat_long = pd.read_csv(path)
+        self.names = states_lat_long['state_name'].to_numpy()
+        self.codes = states_lat_long['state'].to_numpy()
+        self.latitudes = states_lat_long['latitude'].to_numpy(dtype=np.float64)
+        self.longitudes = states_lat_long['longitude'].to_numpy(dtype=np.float64)
+        self.position = {name: i for i, name in enumerate(self.names)}
+
+    # USPS code, latitude and longitude of a state name (None when unknown)
+    def lookup(self, name):
+        i = self.position.get(name)
+        if i is None:
+            return None
+        return self.codes[i], self.latitudes[i], self.longitudes[i]
+
+
+class MapTable:
+    # Production totals of the states known to the index, in the cube's state order
+    def __init__(self, cube, index):
+        self.cube = cube
+        self.matched = np.array([i for i, state in enumerate(cube.states) if state in index.position],
+                                dtype=np.int64)
+        self.states = cube.states[self.matched]
+        self.codes = np.array([index.codes[index.position[state]] for state in self.states])
+        self.production = cube.totals_by_state('production')[self.matched]
+        self.row = {state: i for i, state in enumerate(self.states)}
+
+    # Production of the matched states over a resolved year range (NaN without data)
+    def range_production(self, years):
+        if years is None:
+            return self.production
+        production = self.cube.totals_by_state('production', years)[self.matched]
+        return np.where(self.cube.range_present(years)[self.matched], production, np.nan)
+
+    # Columns of the map for 'All', a single state or several states
+    # (states missing from the index are left out)
+    def select(self, state, years=None):
+        production = self.range_production(years)
+        if state == 'All':
+            return self.codes, production, self.states
+        if isinstance(state, str):
+            i = self.row.get(state)
+            rows = slice(0, 0) if i is None else slice(i, i + 1)
+        else:
+            rows = np.array([self.row[name] for name in state if name in self.row], dtype=np.int64)
+        return self.codes[rows], production[rows], self.states[rows]